@@ -0,0 +1,365 @@
+"""Database snapshots and incremental exports.
+
+A full export is a gzip-compressed copy of the database. An incremental
+export is gzip-compressed NDJSON holding the current state of every row
+recorded in ``change_log`` since the previous export: an ``upsert`` with
+the whole row, or a ``delete`` with its key when the row is gone. The
+first line is a header with the ``change_log`` range the file covers, so
+:func:`restore` can check that a base and its deltas form a chain.
+"""
+from __future__ import annotations
+
+import gzip
+import json
+import logging
+import shutil
+import sqlite3
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+from absence_bot import rollups
+from absence_bot.models import CHANGE_TRACKED_TABLES
+
+LOGGER = logging.getLogger(__name__)
+
+COMPRESSION_LEVEL = 6
+# Pages copied per backup step (1 MiB with the default 4 KiB page size) and
+# the pause between steps, during which writers can take the lock.
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_STEP_PAUSE_SECONDS = 0.05
+# A write from another connection restarts a paged copy. After this many
+# restarts the copy is redone in one step, which holds the read lock and
+# cannot restart.
+BACKUP_MAX_RESTARTS = 3
+DELTA_FORMAT = 1
+
+
+class _BackupRestarted(Exception):
+    pass
+
+
+@dataclass
+class BackupProgress:
+    """Progress of a running snapshot, written by the worker thread."""
+
+    copied_pages: int = 0
+    total_pages: int = 0
+    compressing: bool = False
+
+    @property
+    def fraction(self) -> float:
+        return self.copied_pages / self.total_pages if self.total_pages else 0.0
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """A compressed export file: a full copy of the database or a delta.
+
+    ``sequence`` is the last ``change_log`` entry the export includes.
+    """
+
+    path: Path
+    filename: str
+    raw_bytes: int
+    compressed_bytes: int
+    elapsed_seconds: float
+    sequence: int = 0
+
+    @property
+    def ratio(self) -> float:
+        return self.raw_bytes / self.compressed_bytes if self.compressed_bytes else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{_format_size(self.compressed_bytes)} "
+            f"({_format_size(self.raw_bytes)} raw, {self.ratio:.1f}x) "
+            f"in {self.elapsed_seconds:.1f}s"
+        )
+
+
+def _format_size(size: int) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+
+def _last_change(connection: sqlite3.Connection) -> int:
+    try:
+        row = connection.execute(
+            "SELECT seq FROM sqlite_sequence WHERE name = 'change_log'"
+        ).fetchone()
+    except sqlite3.OperationalError:
+        # No AUTOINCREMENT table has been written to yet.
+        return 0
+    return row[0] if row else 0
+
+
+def _timestamp() -> str:
+    return time.strftime("%Y%m%d-%H%M%S")
+
+
+def create_snapshot(
+    source_path: Path,
+    progress: Optional[BackupProgress] = None,
+    pages: int = BACKUP_PAGES_PER_STEP,
+    pause_seconds: float = BACKUP_STEP_PAUSE_SECONDS,
+) -> Snapshot:
+    """Copy ``source_path`` with the SQLite online backup API and gzip it.
+
+    Blocking; call it from a worker thread. The copy is consistent even
+    while the bot keeps writing and includes anything still in the WAL.
+    Pages are copied ``pages`` at a time with a short pause between steps
+    so writers are not locked out for the whole copy. A write during the
+    copy restarts it; after the first restart the pauses stop, and after
+    ``BACKUP_MAX_RESTARTS`` the copy is redone in a single step so a busy
+    database cannot keep it from finishing. Only the compressed file is
+    kept.
+    """
+    if not source_path.exists():
+        raise FileNotFoundError(f"Database file not found at {source_path}")
+
+    started = time.perf_counter()
+    restarts = 0
+    copied = 0
+
+    def on_step(status: int, remaining: int, total: int) -> None:
+        nonlocal restarts, copied
+        if total - remaining <= copied:
+            restarts += 1
+            LOGGER.warning(
+                "Backup of %s restarted by a concurrent write (%d of %d).",
+                source_path,
+                restarts,
+                BACKUP_MAX_RESTARTS,
+            )
+            if restarts >= BACKUP_MAX_RESTARTS:
+                raise _BackupRestarted
+        copied = total - remaining
+        if progress is not None:
+            progress.total_pages = total
+            progress.copied_pages = copied
+        if remaining and pause_seconds and not restarts:
+            time.sleep(pause_seconds)
+
+    with tempfile.TemporaryDirectory(prefix="absence_bot_backup_") as workdir:
+        raw_path = Path(workdir) / "snapshot.sqlite3"
+        source = sqlite3.connect(source_path)
+        dest = sqlite3.connect(raw_path)
+        try:
+            try:
+                source.backup(dest, pages=pages, progress=on_step)
+            except _BackupRestarted:
+                LOGGER.warning("Copying %s in a single step instead.", source_path)
+                source.backup(dest)
+        finally:
+            dest.close()
+            source.close()
+        raw_bytes = raw_path.stat().st_size
+        copy = sqlite3.connect(raw_path)
+        try:
+            sequence = _last_change(copy)
+        finally:
+            copy.close()
+        if progress is not None:
+            progress.compressing = True
+
+        filename = f"absence_bot_{_timestamp()}.sqlite3"
+        with tempfile.NamedTemporaryFile(
+            prefix="absence_bot_backup_", suffix=".sqlite3.gz", delete=False
+        ) as handle:
+            compressed_path = Path(handle.name)
+            with raw_path.open("rb") as raw, gzip.GzipFile(
+                filename=filename,
+                mode="wb",
+                fileobj=handle,
+                compresslevel=COMPRESSION_LEVEL,
+            ) as compressed:
+                shutil.copyfileobj(raw, compressed, 1024 * 1024)
+
+    return Snapshot(
+        path=compressed_path,
+        filename=f"{filename}.gz",
+        raw_bytes=raw_bytes,
+        compressed_bytes=compressed_path.stat().st_size,
+        elapsed_seconds=time.perf_counter() - started,
+        sequence=sequence,
+    )
+
+
+class _CountingWriter:
+    def __init__(self, target: Any) -> None:
+        self.target = target
+        self.written = 0
+
+    def write_line(self, record: dict[str, Any]) -> None:
+        data = (json.dumps(record, separators=(",", ":"), ensure_ascii=False) + "\n").encode()
+        self.written += len(data)
+        self.target.write(data)
+
+
+def create_delta(source_path: Path, after: int) -> Snapshot:
+    """Write the rows changed after ``change_log`` entry ``after``.
+
+    Blocking; call it from a worker thread. Everything is read in one
+    transaction, so the rows match the ``change_log`` range in the header.
+    """
+    if not source_path.exists():
+        raise FileNotFoundError(f"Database file not found at {source_path}")
+
+    started = time.perf_counter()
+    connection = sqlite3.connect(source_path, isolation_level=None)
+    connection.row_factory = sqlite3.Row
+    try:
+        connection.execute("BEGIN")
+        through = _last_change(connection)
+        stamp = _timestamp()
+        with tempfile.NamedTemporaryFile(
+            prefix="absence_bot_delta_", suffix=".ndjson.gz", delete=False
+        ) as handle:
+            delta_path = Path(handle.name)
+            with gzip.GzipFile(
+                filename=f"absence_bot_delta_{stamp}.ndjson",
+                mode="wb",
+                fileobj=handle,
+                compresslevel=COMPRESSION_LEVEL,
+            ) as compressed:
+                writer = _CountingWriter(compressed)
+                writer.write_line(
+                    {
+                        "format": DELTA_FORMAT,
+                        "after": after,
+                        "through": through,
+                        "created_at": stamp,
+                    }
+                )
+                deleted: dict[str, list[str]] = {}
+                for table, key in CHANGE_TRACKED_TABLES:
+                    changed = (
+                        "SELECT row_key FROM change_log "
+                        "WHERE table_name = ? AND seq > ? AND seq <= ?"
+                    )
+                    keys = {
+                        str(row[0])
+                        for row in connection.execute(changed, (table, after, through))
+                    }
+                    if not keys:
+                        continue
+                    rows = connection.execute(
+                        f"SELECT * FROM {table} WHERE {key} IN ({changed})",
+                        (table, after, through),
+                    )
+                    for row in rows:
+                        keys.discard(str(row[key]))
+                        writer.write_line({"table": table, "op": "upsert", "row": dict(row)})
+                    deleted[table] = sorted(keys)
+                # Deletes go last and children first, after every upsert.
+                for table, _key in reversed(CHANGE_TRACKED_TABLES):
+                    for row_key in deleted.get(table, ()):
+                        writer.write_line({"table": table, "op": "delete", "key": row_key})
+        connection.execute("COMMIT")
+    finally:
+        connection.close()
+
+    return Snapshot(
+        path=delta_path,
+        filename=f"absence_bot_delta_{after}-{through}_{stamp}.ndjson.gz",
+        raw_bytes=writer.written,
+        compressed_bytes=delta_path.stat().st_size,
+        elapsed_seconds=time.perf_counter() - started,
+        sequence=through,
+    )
+
+
+def _read_delta(path: Path) -> tuple[dict[str, Any], Iterable[dict[str, Any]]]:
+    with gzip.open(path, "rt", encoding="utf-8") as handle:
+        header = json.loads(handle.readline())
+    if header.get("format") != DELTA_FORMAT:
+        raise ValueError(f"{path} is not an AbsenceBot incremental export.")
+
+    def records() -> Iterable[dict[str, Any]]:
+        with gzip.open(path, "rt", encoding="utf-8") as handle:
+            handle.readline()
+            for line in handle:
+                if line.strip():
+                    yield json.loads(line)
+
+    return header, records()
+
+
+def _apply_record(connection: sqlite3.Connection, record: dict[str, Any]) -> None:
+    table = record["table"]
+    key = dict(CHANGE_TRACKED_TABLES).get(table)
+    if key is None:
+        raise ValueError(f"Unknown table {table!r} in incremental export.")
+    if record["op"] == "delete":
+        connection.execute(f"DELETE FROM {table} WHERE {key} = ?", (record["key"],))
+        return
+    row = record["row"]
+    columns = ", ".join(row)
+    placeholders = ", ".join("?" for _ in row)
+    connection.execute(
+        f"INSERT OR REPLACE INTO {table} ({columns}) VALUES ({placeholders})",
+        tuple(row.values()),
+    )
+
+
+def restore(base_path: Path, delta_paths: Iterable[Path], output_path: Path) -> int:
+    """Rebuild a database at ``output_path`` from a full export and its deltas.
+
+    Deltas may be given in any order; they are applied in ``change_log``
+    order. A delta ending at or before what the base and the earlier deltas
+    already cover is skipped, since its rows are older than the ones there.
+    A delta that starts before that point but ends after it is applied in
+    full: each of its records is the row as of the delta's last change, so
+    it is never older than what it replaces. A gap between the base and the
+    deltas raises ``ValueError``. Returns the number of records applied.
+    """
+    deltas = sorted(
+        (_read_delta(path) + (path,) for path in delta_paths),
+        key=lambda item: item[0]["through"],
+    )
+    with base_path.open("rb") as source:
+        compressed = source.read(2) == b"\x1f\x8b"
+    opener = gzip.open if compressed else open
+    with opener(base_path, "rb") as source, output_path.open("wb") as target:
+        shutil.copyfileobj(source, target, 1024 * 1024)
+
+    applied = 0
+    connection = sqlite3.connect(output_path)
+    try:
+        covered = _last_change(connection)
+        for header, records, path in deltas:
+            if header["through"] <= covered:
+                LOGGER.info(
+                    "Skipping %s: changes up to %d are already restored", path.name, covered
+                )
+                continue
+            if header["after"] > covered:
+                raise ValueError(
+                    f"Missing changes {covered + 1}-{header['after']} before {path.name}."
+                )
+            for record in records:
+                _apply_record(connection, record)
+                applied += 1
+            covered = header["through"]
+        tables = {
+            row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+        }
+        # Deltas carry raw absences only; recount the rollup from them.
+        if deltas and "daily_class_absence" in tables:
+            for statement in rollups.REBUILD_SQL:
+                connection.execute(statement)
+        # The restored file starts a new chain: the next scheduled export is a
+        # full one.
+        for table in ("change_log", "export_state"):
+            if table in tables:
+                connection.execute(f"DELETE FROM {table}")
+        connection.commit()
+    finally:
+        connection.close()
+    return applied
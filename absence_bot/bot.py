@@ -1,24 +1,55 @@
 """Main application setup for AbsenceBot."""
 from __future__ import annotations
 
+import asyncio
 import logging
 from datetime import timedelta
 
 from telegram.ext import Application, CallbackQueryHandler, CommandHandler, MessageHandler, filters
 
+from absence_bot.cache import AuthorizationCache, CatalogCache, RosterCache, TtlLruCache
 from absence_bot.config import ConfigError, load_config
-from absence_bot.database import create_database
+from absence_bot.database import close_database, create_database
 from absence_bot.handlers import (
+    CALLBACK_ROUTER,
+    CALLBACK_TOKENS,
     HandlerContext,
     handle_callback,
     handle_message,
+    load_authorization_cache,
+    scheduled_authorization_refresh,
     scheduled_database_export,
     start,
 )
+from absence_bot.render import EditCoalescer, RenderedViews
+from absence_bot.webhook import serve_webhook
 
 LOGGER = logging.getLogger(__name__)
 
 
+async def _load_caches(application: Application) -> None:
+    handler_context: HandlerContext = application.bot_data["handler_context"]
+    await load_authorization_cache(handler_context)
+
+
+async def _shutdown(application: Application) -> None:
+    CALLBACK_ROUTER.log_stats()
+    handler_context: HandlerContext = application.bot_data["handler_context"]
+    handler_context.views.log_stats()
+    handler_context.edits.log_stats()
+    LOGGER.info(
+        "Catalog cache: %d hit(s), %d miss(es).",
+        handler_context.catalog.hits,
+        handler_context.catalog.misses,
+    )
+    LOGGER.info(
+        "Callback tokens: %d live, %d expired lookup(s).",
+        len(CALLBACK_TOKENS),
+        CALLBACK_TOKENS.expired,
+    )
+    close_database(handler_context.database)
+
+
 def build_application() -> Application:
     config = load_config()
     if not config.token:
@@ -29,25 +60,49 @@ def build_application() -> Application:
     except Exception as exc:  # noqa: BLE001
         LOGGER.exception("Database connection failed: %s", exc)
         raise ConfigError("Unable to connect to the database.") from exc
-    application = Application.builder().token(config.token).build()
+    application = (
+        Application.builder()
+        .token(config.token)
+        .post_init(_load_caches)
+        .post_shutdown(_shutdown)
+        .build()
+    )
 
-    application.bot_data["handler_context"] = HandlerContext(config=config, database=database)
+    application.bot_data["handler_context"] = HandlerContext(
+        config=config,
+        database=database,
+        authorization=AuthorizationCache(
+            config.authorized_teacher_ids + config.management_user_ids
+        ),
+        rosters=RosterCache(config.roster_cache_size, config.roster_cache_ttl_seconds),
+        report_cache=TtlLruCache(config.report_cache_size, config.report_cache_ttl_seconds),
+        edits=EditCoalescer(config.toggle_edit_delay_ms / 1000),
+        views=RenderedViews(),
+        catalog=CatalogCache(),
+    )
 
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CallbackQueryHandler(handle_callback))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
     if application.job_queue is None:
         LOGGER.warning(
-            "Job queue unavailable; scheduled database exports are disabled. "
+            "Job queue unavailable; scheduled database exports and authorization "
+            "refreshes are disabled. "
             "Install python-telegram-bot[job-queue] to enable them."
         )
     else:
         application.job_queue.run_repeating(
             scheduled_database_export,
-            interval=timedelta(hours=12),
-            first=timedelta(hours=12),
+            interval=timedelta(hours=config.export_interval_hours),
+            first=timedelta(hours=config.export_interval_hours),
             name="automatic-database-export",
         )
+        application.job_queue.run_repeating(
+            scheduled_authorization_refresh,
+            interval=timedelta(seconds=config.auth_refresh_seconds),
+            first=timedelta(seconds=config.auth_refresh_seconds),
+            name="authorization-cache-refresh",
+        )
 
     return application
 
@@ -60,6 +115,12 @@ def run() -> None:
     )
     LOGGER.info("Loading configuration from environment variables")
     application = build_application()
+    handler_context: HandlerContext = application.bot_data["handler_context"]
+    webhook = handler_context.config.webhook
+    if webhook is not None:
+        LOGGER.info("Starting AbsenceBot in webhook mode")
+        asyncio.run(serve_webhook(application, webhook))
+        return
     LOGGER.info("Starting AbsenceBot")
     application.run_polling()
 
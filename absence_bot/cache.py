@@ -0,0 +1,168 @@
+"""In-process caches for hot read paths."""
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterable, NamedTuple, Optional
+
+
+class AuthorizationCache:
+    """Set-based view of every user allowed to use the bot.
+
+    Holds the IDs from configuration plus the ``authorized_teachers`` table so
+    that authorization checks never hit the database. The table part is
+    replaced wholesale by :meth:`load` and updated in place by :meth:`add`.
+    ``hits`` and ``misses`` count lookups that did and did not find the user;
+    neither costs a database round trip.
+    """
+
+    def __init__(self, configured_ids: Iterable[int]) -> None:
+        self._configured = frozenset(configured_ids)
+        self._teachers: frozenset[int] = frozenset()
+        # IDs added since the last load; merged into the next load in case it
+        # read the table before the insert was committed.
+        self._pending: set[int] = set()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._configured | self._teachers)
+
+    def load(self, teacher_ids: Iterable[int]) -> None:
+        self._teachers = frozenset(teacher_ids) | self._pending
+        self._pending.clear()
+
+    def add(self, teacher_id: int) -> None:
+        self._pending.add(teacher_id)
+        self._teachers = self._teachers | {teacher_id}
+
+    def is_authorized(self, user_id: int) -> bool:
+        if user_id in self._configured or user_id in self._teachers:
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+
+class RosterEntry(NamedTuple):
+    id: str
+    full_name: str
+
+
+class RosterPage(NamedTuple):
+    entries: tuple[RosterEntry, ...]
+    has_next: bool
+
+
+# Keys start with ``(grade, major)``; the rest identifies the cached item.
+RosterKey = tuple[Hashable, ...]
+
+
+class TtlLruCache:
+    """Size-bounded LRU whose entries expire after ``ttl_seconds``.
+
+    Every invalidation bumps ``generation``; a value loaded under an older
+    generation is not stored, so a read that raced a write cannot
+    repopulate the cache with stale rows.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._max_entries = max_entries
+        self._ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= self._clock():
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: Hashable, value: Any, generation: int) -> None:
+        if generation != self.generation:
+            return
+        self._entries[key] = (self._clock() + self._ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self) -> None:
+        """Drop everything."""
+        self.generation += 1
+        self._entries.clear()
+
+
+class RosterCache(TtlLruCache):
+    """Cache of per-class roster data such as pages and counts.
+
+    Keys begin with ``(grade, major)`` so a whole class can be invalidated at
+    once.
+    """
+
+    def invalidate(self, grade: Optional[str] = None, major: Optional[str] = None) -> None:
+        """Drop one class, every class in ``grade``, or everything."""
+        self.generation += 1
+        if grade is None:
+            self._entries.clear()
+            return
+        for key in [key for key in self._entries if key[0] == grade]:
+            if major is None or key[1] == major:
+                del self._entries[key]
+
+
+class Catalog(NamedTuple):
+    version: int
+    grades: tuple[str, ...]
+    majors: dict[str, tuple[str, ...]]
+
+
+class CatalogCache:
+    """Grade and major lists, and keyboards built from them.
+
+    Tagged with the ``catalog_version`` they were read at: callers check
+    the version in the database and :meth:`load` a fresh catalog when it
+    has moved, which also drops every keyboard built from the old one.
+    ``hits`` and ``misses`` count checks that did and did not find the
+    cached catalog current.
+    """
+
+    def __init__(self) -> None:
+        self.catalog: Optional[Catalog] = None
+        self._markups: dict[Hashable, Any] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def version(self) -> Optional[int]:
+        return self.catalog.version if self.catalog is not None else None
+
+    def load(self, catalog: Catalog) -> None:
+        self.catalog = catalog
+        self._markups.clear()
+
+    def markup(
+        self,
+        key: Hashable,
+        build: Callable[[], Any],
+        valid: Optional[Callable[[Any], bool]] = None,
+    ) -> Any:
+        """Return the keyboard for ``key``, building it once per catalog version.
+
+        A cached keyboard that ``valid`` rejects is built again.
+        """
+        markup = self._markups.get(key)
+        if markup is None or (valid is not None and not valid(markup)):
+            markup = self._markups[key] = build()
+        return markup
@@ -0,0 +1,81 @@
+"""Short opaque tokens standing in for long callback data."""
+from __future__ import annotations
+
+import secrets
+from collections import OrderedDict
+from typing import Optional
+
+from telegram import InlineKeyboardMarkup
+
+TOKEN_PREFIX = "~"
+TOKEN_ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz-_"
+MAX_CALLBACK_TOKENS = 50_000
+
+
+def _base64(number: int) -> str:
+    digits = []
+    while True:
+        number, digit = divmod(number, len(TOKEN_ALPHABET))
+        digits.append(TOKEN_ALPHABET[digit])
+        if not number:
+            return "".join(reversed(digits))
+
+
+class CallbackTokens:
+    """Map callback payloads to tokens of a few bytes and back.
+
+    Telegram limits callback data to 64 bytes, which a payload such as
+    ``major:delete:<name>`` can exceed. :meth:`encode` hands out a token
+    like ``~k3Xa1F`` instead, reusing the live token of an equal payload
+    so re-rendered keyboards do not change, and :meth:`decode` turns it
+    back with one dict lookup. The table keeps the ``max_tokens`` most
+    recently used tokens; each process starts a new token generation, so
+    a token evicted or issued before a restart decodes to ``None`` rather
+    than to some other payload. Data without the token prefix is passed
+    through unchanged. ``expired`` counts failed lookups.
+    """
+
+    def __init__(self, max_tokens: int = MAX_CALLBACK_TOKENS) -> None:
+        self.max_tokens = max_tokens
+        self._generation = TOKEN_PREFIX + secrets.token_urlsafe(3)
+        self._payloads: OrderedDict[str, str] = OrderedDict()
+        self._tokens: dict[str, str] = {}
+        self._issued = 0
+        self.expired = 0
+
+    def __len__(self) -> int:
+        return len(self._payloads)
+
+    def encode(self, payload: str) -> str:
+        token = self._tokens.get(payload)
+        if token is not None:
+            self._payloads.move_to_end(token)
+            return token
+        token = self._generation + _base64(self._issued)
+        self._issued += 1
+        self._payloads[token] = payload
+        self._tokens[payload] = token
+        while len(self._payloads) > self.max_tokens:
+            _, evicted = self._payloads.popitem(last=False)
+            del self._tokens[evicted]
+        return token
+
+    def decode(self, data: str) -> Optional[str]:
+        if not data.startswith(TOKEN_PREFIX):
+            return data
+        payload = self._payloads.get(data)
+        if payload is None:
+            self.expired += 1
+        return payload
+
+    def retain(self, markup: InlineKeyboardMarkup) -> bool:
+        """Mark the tokens on ``markup`` as used; ``False`` if any has expired."""
+        for row in markup.inline_keyboard:
+            for button in row:
+                data = button.callback_data
+                if not isinstance(data, str) or not data.startswith(TOKEN_PREFIX):
+                    continue
+                if data not in self._payloads:
+                    return False
+                self._payloads.move_to_end(data)
+        return True
@@ -1,8 +1,168 @@
 """Command-line entry points for AbsenceBot."""
 from __future__ import annotations
 
+import argparse
+import json
+from pathlib import Path
+from typing import Any, Optional, Sequence
+
+import httpx
+from sqlalchemy import inspect
+
+from absence_bot import rollups
+from absence_bot.backup import restore
 from absence_bot.bot import main as run_main
+from absence_bot.config import ConfigError, load_config
+from absence_bot.database import build_engine, close_database, create_database, session_scope
+from absence_bot.migrations import explain_hot_queries, initialize_schema
+from absence_bot.webhook import SECRET_HEADER
+
+
+def _migrate(explain: bool) -> None:
+    engine = build_engine(load_config().database)
+    before = explain_hot_queries(engine) if explain and inspect(engine).has_table("students") else {}
+    applied = initialize_schema(engine)
+    if applied:
+        print(f"Applied {len(applied)} migration(s):")
+        for migration in applied:
+            print(f"  {migration.version}: {migration.description}")
+    else:
+        print("Database schema is up to date.")
+
+    if explain:
+        after = explain_hot_queries(engine)
+        for name, plan in after.items():
+            print(f"[{name}]")
+            if name in before:
+                print("  before: " + "; ".join(before[name]))
+            print("  after:  " + "; ".join(plan))
+    engine.dispose()
+
+
+def _load_updates(path: Path) -> list[Any]:
+    """Read a JSON update, a JSON array of updates, or one update per line."""
+    content = path.read_text(encoding="utf-8").strip()
+    try:
+        data = json.loads(content)
+    except ValueError:
+        return [json.loads(line) for line in content.splitlines() if line.strip()]
+    return data if isinstance(data, list) else [data]
+
+
+def _replay(
+    path: Path,
+    url: Optional[str],
+    secret: Optional[str],
+    cafile: Optional[Path],
+    insecure: bool,
+) -> None:
+    webhook = load_config().webhook
+    if url is None:
+        if webhook is None:
+            raise ConfigError("Pass --url or set ABSENCEBOT_MODE=webhook to replay updates.")
+        scheme = "https" if webhook.cert_path else "http"
+        url = f"{scheme}://{webhook.listen}:{webhook.port}{webhook.url_path}"
+        if cafile is None and webhook.cert_path:
+            # The local listener's certificate is usually self-signed.
+            cafile = Path(webhook.cert_path)
+    if secret is None and webhook is not None:
+        secret = webhook.secret_token
+
+    headers = {SECRET_HEADER: secret} if secret else {}
+    verify: bool | str = True
+    if insecure:
+        verify = False
+    elif cafile is not None:
+        verify = str(cafile)
+    with httpx.Client(headers=headers, verify=verify) as client:
+        for update in _load_updates(path):
+            try:
+                response = client.post(url, json=update)
+            except httpx.HTTPError as exc:
+                raise SystemExit(f"Replay to {url} failed: {exc}") from exc
+            print(f"update {update.get('update_id', '?')}: HTTP {response.status_code}")
+
+
+def _restore(base: Path, deltas: list[Path], output: Path, force: bool) -> None:
+    if output.exists() and not force:
+        raise SystemExit(f"{output} already exists; pass --force to overwrite it.")
+    try:
+        applied = restore(base, deltas, output)
+    except ValueError as exc:
+        output.unlink(missing_ok=True)
+        raise SystemExit(f"Restore failed: {exc}") from exc
+    print(f"Restored {output} from {base.name} and {len(deltas)} delta(s), {applied} change(s).")
+
+
+def _rebuild_rollups() -> None:
+    database = create_database(load_config().database)
+    try:
+        with session_scope(database) as session:
+            rows = rollups.rebuild(session)
+    finally:
+        close_database(database)
+    print(f"Rebuilt daily_class_absence: {rows} class-day row(s).")
+
 
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="absence_bot", description="AbsenceBot Telegram bot.")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("run", help="Start the bot (default).")
+    migrate_parser = commands.add_parser("migrate", help="Apply pending database migrations.")
+    migrate_parser.add_argument(
+        "--explain",
+        action="store_true",
+        help="Print query plans for the hot queries before and after migrating.",
+    )
+    replay_parser = commands.add_parser(
+        "replay", help="POST recorded Telegram updates to a running webhook."
+    )
+    replay_parser.add_argument("path", type=Path, help="JSON or NDJSON file of updates.")
+    replay_parser.add_argument("--url", help="Webhook URL (defaults to the configured listener).")
+    replay_parser.add_argument("--secret", help="Secret token (defaults to ABSENCEBOT_WEBHOOK_SECRET).")
+    replay_parser.add_argument(
+        "--cafile",
+        type=Path,
+        help="CA bundle to verify the webhook's certificate "
+        "(defaults to ABSENCEBOT_WEBHOOK_CERT for the configured listener).",
+    )
+    replay_parser.add_argument(
+        "--insecure",
+        action="store_true",
+        help="Do not verify the webhook's certificate. The secret token is sent regardless.",
+    )
+    restore_parser = commands.add_parser(
+        "restore", help="Rebuild a database from a full export and incremental exports."
+    )
+    restore_parser.add_argument("base", type=Path, help="Full export (.sqlite3 or .sqlite3.gz).")
+    restore_parser.add_argument(
+        "deltas",
+        type=Path,
+        nargs="*",
+        help="Incremental exports (.ndjson.gz), in any order; ones the base already covers "
+        "are skipped.",
+    )
+    restore_parser.add_argument(
+        "-o", "--output", type=Path, required=True, help="Path of the database to write."
+    )
+    restore_parser.add_argument(
+        "--force", action="store_true", help="Overwrite the output file if it exists."
+    )
+    commands.add_parser(
+        "rebuild-rollups", help="Recompute the per-class daily absence counts from history."
+    )
+    args = parser.parse_args(argv)
 
-def main() -> None:
+    if args.command == "migrate":
+        _migrate(args.explain)
+        return
+    if args.command == "rebuild-rollups":
+        _rebuild_rollups()
+        return
+    if args.command == "restore":
+        _restore(args.base, args.deltas, args.output, args.force)
+        return
+    if args.command == "replay":
+        _replay(args.path, args.url, args.secret, args.cafile, args.insecure)
+        return
     run_main()
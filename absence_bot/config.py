@@ -1,15 +1,42 @@
 """Configuration loader for AbsenceBot."""
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import os
-from typing import List
+import re
+from typing import List, Optional, Sequence
 from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 
+@dataclass(frozen=True)
+class SqliteProfile:
+    """Pragmas applied to every new SQLite connection."""
+
+    journal_mode: str = "WAL"
+    synchronous: str = "NORMAL"
+    busy_timeout_ms: int = 5000
+    cache_size_kib: int = 20000
+    mmap_size_bytes: int = 256 * 1024 * 1024
+    temp_store: str = "MEMORY"
+    foreign_keys: bool = True
+
+
 @dataclass(frozen=True)
 class DatabaseConfig:
     sqlite_path: str
+    worker_threads: int = 4
+    sqlite_profile: Optional[SqliteProfile] = field(default_factory=SqliteProfile)
+
+
+@dataclass(frozen=True)
+class WebhookConfig:
+    listen: str
+    port: int
+    url_path: str
+    secret_token: str
+    public_url: Optional[str] = None
+    cert_path: Optional[str] = None
+    key_path: Optional[str] = None
 
 
 @dataclass(frozen=True)
@@ -20,6 +47,16 @@ class BotConfig:
     management_user_ids: List[int]
     page_size: int
     database: DatabaseConfig
+    auth_refresh_seconds: int = 300
+    roster_cache_size: int = 512
+    roster_cache_ttl_seconds: int = 300
+    report_cache_size: int = 128
+    report_cache_ttl_seconds: int = 3600
+    export_interval_hours: int = 12
+    full_export_interval_hours: int = 168
+    export_heartbeat: bool = False
+    toggle_edit_delay_ms: int = 500
+    webhook: Optional[WebhookConfig] = None
 
 
 class ConfigError(RuntimeError):
@@ -43,6 +80,110 @@ def _parse_int_list(value: str, field_name: str) -> List[int]:
     return ids
 
 
+def _parse_positive_int(name: str, default: int) -> int:
+    raw = os.getenv(name, str(default)).strip() or str(default)
+    try:
+        value = int(raw)
+    except ValueError as exc:
+        raise ConfigError(f"{name} must be an integer.") from exc
+
+    if value <= 0:
+        raise ConfigError(f"{name} must be greater than zero.")
+    return value
+
+
+def _parse_non_negative_int(name: str, default: int) -> int:
+    raw = os.getenv(name, str(default)).strip() or str(default)
+    try:
+        value = int(raw)
+    except ValueError as exc:
+        raise ConfigError(f"{name} must be an integer.") from exc
+
+    if value < 0:
+        raise ConfigError(f"{name} must not be negative.")
+    return value
+
+
+def _parse_choice(name: str, default: str, choices: Sequence[str]) -> str:
+    value = os.getenv(name, default).strip().upper() or default
+    if value not in choices:
+        raise ConfigError(f"{name} must be one of: {', '.join(choices)}.")
+    return value
+
+
+def _load_sqlite_profile() -> Optional[SqliteProfile]:
+    profile = os.getenv("ABSENCEBOT_SQLITE_PROFILE", "performance").strip().lower() or "performance"
+    if profile == "off":
+        return None
+    if profile != "performance":
+        raise ConfigError("ABSENCEBOT_SQLITE_PROFILE must be 'performance' or 'off'.")
+
+    defaults = SqliteProfile()
+    return SqliteProfile(
+        journal_mode=_parse_choice(
+            "ABSENCEBOT_SQLITE_JOURNAL_MODE",
+            defaults.journal_mode,
+            ("WAL", "DELETE", "TRUNCATE", "PERSIST", "MEMORY", "OFF"),
+        ),
+        synchronous=_parse_choice(
+            "ABSENCEBOT_SQLITE_SYNCHRONOUS",
+            defaults.synchronous,
+            ("OFF", "NORMAL", "FULL", "EXTRA"),
+        ),
+        busy_timeout_ms=_parse_non_negative_int(
+            "ABSENCEBOT_SQLITE_BUSY_TIMEOUT_MS", defaults.busy_timeout_ms
+        ),
+        cache_size_kib=_parse_positive_int(
+            "ABSENCEBOT_SQLITE_CACHE_SIZE_KIB", defaults.cache_size_kib
+        ),
+        mmap_size_bytes=_parse_non_negative_int(
+            "ABSENCEBOT_SQLITE_MMAP_SIZE_BYTES", defaults.mmap_size_bytes
+        ),
+        temp_store=_parse_choice(
+            "ABSENCEBOT_SQLITE_TEMP_STORE",
+            defaults.temp_store,
+            ("DEFAULT", "FILE", "MEMORY"),
+        ),
+        foreign_keys=_parse_choice("ABSENCEBOT_SQLITE_FOREIGN_KEYS", "ON", ("ON", "OFF")) == "ON",
+    )
+
+
+def _load_webhook_config() -> Optional[WebhookConfig]:
+    mode = os.getenv("ABSENCEBOT_MODE", "polling").strip().lower() or "polling"
+    if mode == "polling":
+        return None
+    if mode != "webhook":
+        raise ConfigError("ABSENCEBOT_MODE must be 'polling' or 'webhook'.")
+
+    secret_token = os.getenv("ABSENCEBOT_WEBHOOK_SECRET", "").strip()
+    # Telegram only accepts 1-256 characters from this set for secret tokens.
+    if not re.fullmatch(r"[A-Za-z0-9_-]{1,256}", secret_token):
+        raise ConfigError(
+            "ABSENCEBOT_WEBHOOK_SECRET is required in webhook mode and may only contain "
+            "letters, digits, '_' and '-' (up to 256 characters)."
+        )
+
+    port = _parse_positive_int("ABSENCEBOT_WEBHOOK_PORT", 8443)
+    if port > 65535:
+        raise ConfigError("ABSENCEBOT_WEBHOOK_PORT must be a valid TCP port.")
+
+    cert_path = os.getenv("ABSENCEBOT_WEBHOOK_CERT", "").strip() or None
+    key_path = os.getenv("ABSENCEBOT_WEBHOOK_KEY", "").strip() or None
+    if bool(cert_path) != bool(key_path):
+        raise ConfigError("ABSENCEBOT_WEBHOOK_CERT and ABSENCEBOT_WEBHOOK_KEY must be set together.")
+
+    url_path = os.getenv("ABSENCEBOT_WEBHOOK_PATH", "/telegram").strip() or "/telegram"
+    return WebhookConfig(
+        listen=os.getenv("ABSENCEBOT_WEBHOOK_LISTEN", "127.0.0.1").strip() or "127.0.0.1",
+        port=port,
+        url_path=url_path if url_path.startswith("/") else f"/{url_path}",
+        secret_token=secret_token,
+        public_url=os.getenv("ABSENCEBOT_WEBHOOK_URL", "").strip().rstrip("/") or None,
+        cert_path=cert_path,
+        key_path=key_path,
+    )
+
+
 def load_config() -> BotConfig:
     token = os.getenv("ABSENCEBOT_TOKEN", "").strip()
     timezone = os.getenv("ABSENCEBOT_TIMEZONE", "UTC").strip() or "UTC"
@@ -51,14 +192,7 @@ def load_config() -> BotConfig:
     except ZoneInfoNotFoundError as exc:
         raise ConfigError(f"Invalid timezone: {timezone}") from exc
 
-    page_size_raw = os.getenv("ABSENCEBOT_PAGE_SIZE", "10").strip() or "10"
-    try:
-        page_size = int(page_size_raw)
-    except ValueError as exc:
-        raise ConfigError("ABSENCEBOT_PAGE_SIZE must be an integer.") from exc
-
-    if page_size <= 0:
-        raise ConfigError("ABSENCEBOT_PAGE_SIZE must be greater than zero.")
+    page_size = _parse_positive_int("ABSENCEBOT_PAGE_SIZE", 10)
 
     return BotConfig(
         token=token,
@@ -75,5 +209,19 @@ def load_config() -> BotConfig:
         database=DatabaseConfig(
             sqlite_path=os.getenv("ABSENCEBOT_DB_PATH", "absence_bot.sqlite3").strip()
             or "absence_bot.sqlite3",
+            worker_threads=_parse_positive_int("ABSENCEBOT_DB_WORKERS", 4),
+            sqlite_profile=_load_sqlite_profile(),
+        ),
+        auth_refresh_seconds=_parse_positive_int("ABSENCEBOT_AUTH_REFRESH_SECONDS", 300),
+        roster_cache_size=_parse_positive_int("ABSENCEBOT_ROSTER_CACHE_SIZE", 512),
+        roster_cache_ttl_seconds=_parse_positive_int("ABSENCEBOT_ROSTER_CACHE_TTL", 300),
+        report_cache_size=_parse_positive_int("ABSENCEBOT_REPORT_CACHE_SIZE", 128),
+        report_cache_ttl_seconds=_parse_positive_int("ABSENCEBOT_REPORT_CACHE_TTL", 3600),
+        export_interval_hours=_parse_positive_int("ABSENCEBOT_EXPORT_INTERVAL_HOURS", 12),
+        full_export_interval_hours=_parse_positive_int(
+            "ABSENCEBOT_FULL_EXPORT_INTERVAL_HOURS", 168
         ),
+        export_heartbeat=_parse_choice("ABSENCEBOT_EXPORT_HEARTBEAT", "OFF", ("ON", "OFF")) == "ON",
+        toggle_edit_delay_ms=_parse_non_negative_int("ABSENCEBOT_TOGGLE_EDIT_DELAY_MS", 500),
+        webhook=_load_webhook_config(),
     )
@@ -1,33 +1,84 @@
 """Database connection helpers."""
 from __future__ import annotations
 
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from dataclasses import dataclass
-from typing import Iterator
+from functools import partial
+from typing import Any, Callable, Iterator, TypeVar
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.engine import Engine
 from sqlalchemy.orm import Session, sessionmaker
 
-from absence_bot.config import DatabaseConfig
-from absence_bot.models import Base
+from absence_bot.config import DatabaseConfig, SqliteProfile
+from absence_bot.migrations import initialize_schema
+
+T = TypeVar("T")
 
 
 @dataclass
 class Database:
     engine: Engine
     session_factory: sessionmaker
+    executor: ThreadPoolExecutor
 
 
 def _build_database_url(config: DatabaseConfig) -> str:
     return f"sqlite:///{config.sqlite_path}"
 
 
+def _profile_pragmas(profile: SqliteProfile) -> list[str]:
+    return [
+        f"PRAGMA journal_mode={profile.journal_mode}",
+        f"PRAGMA synchronous={profile.synchronous}",
+        f"PRAGMA busy_timeout={int(profile.busy_timeout_ms)}",
+        # A negative cache_size is a size in KiB rather than in pages.
+        f"PRAGMA cache_size=-{int(profile.cache_size_kib)}",
+        f"PRAGMA mmap_size={int(profile.mmap_size_bytes)}",
+        f"PRAGMA temp_store={profile.temp_store}",
+        f"PRAGMA foreign_keys={'ON' if profile.foreign_keys else 'OFF'}",
+    ]
+
+
+def build_engine(config: DatabaseConfig) -> Engine:
+    # No pool_pre_ping: a local SQLite file cannot drop the connection, so the
+    # ping would only add a round trip to every checkout.
+    engine = create_engine(
+        _build_database_url(config),
+        pool_size=config.worker_threads,
+        future=True,
+    )
+    if config.sqlite_profile is not None:
+        pragmas = _profile_pragmas(config.sqlite_profile)
+
+        @event.listens_for(engine, "connect")
+        def _apply_profile(dbapi_connection: Any, connection_record: Any) -> None:
+            cursor = dbapi_connection.cursor()
+            for pragma in pragmas:
+                cursor.execute(pragma)
+            cursor.close()
+
+    return engine
+
+
 def create_database(config: DatabaseConfig) -> Database:
-    url = _build_database_url(config)
-    engine = create_engine(url, pool_pre_ping=True, future=True)
-    Base.metadata.create_all(engine)
-    return Database(engine=engine, session_factory=sessionmaker(bind=engine, expire_on_commit=False))
+    engine = build_engine(config)
+    initialize_schema(engine)
+    return Database(
+        engine=engine,
+        session_factory=sessionmaker(bind=engine, expire_on_commit=False),
+        executor=ThreadPoolExecutor(
+            max_workers=config.worker_threads,
+            thread_name_prefix="absence-bot-db",
+        ),
+    )
+
+
+def close_database(database: Database) -> None:
+    database.executor.shutdown(wait=True)
+    database.engine.dispose()
 
 
 @contextmanager
@@ -41,3 +92,24 @@ def session_scope(database: Database) -> Iterator[Session]:
         raise
     finally:
         session.close()
+
+
+def _call_in_session(
+    database: Database, func: Callable[..., T], args: tuple[Any, ...], kwargs: dict[str, Any]
+) -> T:
+    with session_scope(database) as session:
+        return func(session, *args, **kwargs)
+
+
+async def run_in_session(
+    database: Database, func: Callable[..., T], *args: Any, **kwargs: Any
+) -> T:
+    """Run ``func(session, *args, **kwargs)`` in a worker thread inside ``session_scope``.
+
+    Handlers must never touch a session directly: a slow query or commit would
+    otherwise block the event loop for every other user.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        database.executor, partial(_call_in_session, database, func, args, kwargs)
+    )
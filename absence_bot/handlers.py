@@ -1,28 +1,55 @@
 """Telegram bot handlers for AbsenceBot."""
 from __future__ import annotations
 
+import asyncio
 import logging
-import sqlite3
-import tempfile
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import date, datetime, timedelta, timezone
 from pathlib import Path
 from zoneinfo import ZoneInfo
-from typing import Iterable, List, Optional
+from typing import Any, Callable, Iterable, List, Optional, TypeVar
 
-from telegram import InlineKeyboardButton, Update
+from sqlalchemy import insert, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Message, Update
 from telegram.constants import ParseMode
+from telegram.error import TelegramError
 from telegram.ext import ContextTypes
 
+from absence_bot import queries, reports, rollups
+from absence_bot.backup import BackupProgress, Snapshot, create_delta, create_snapshot
+from absence_bot.cache import (
+    AuthorizationCache,
+    Catalog,
+    CatalogCache,
+    RosterCache,
+    RosterPage,
+    TtlLruCache,
+)
+from absence_bot.callbacks import CallbackTokens
 from absence_bot.config import BotConfig
-from absence_bot.database import Database, session_scope
-from absence_bot.keyboards import build_menu, paginated_buttons, simple_button
-from absence_bot.models import Absence, AuthorizedTeacher, Grade, Major, Student
+from absence_bot.database import Database, run_in_session
+from absence_bot.keyboards import build_menu, page_buttons, relabel_button, simple_button
+from absence_bot.models import (
+    Absence,
+    AuthorizedTeacher,
+    ChangeLog,
+    ExportState,
+    Grade,
+    Major,
+    Student,
+)
+from absence_bot.render import EditCoalescer, RenderedViews
+from absence_bot.routing import ROLE_MANAGEMENT, CallbackRouter
 
 LOGGER = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
 STATE_ADDING_STUDENTS = "adding_students"
 STATE_ABSENCE_SELECTION = "absence_selection"
+STATE_ABSENCE_VIEW = "absence_view"
 STATE_ADDING_GRADE = "adding_grade"
 STATE_ADDING_MAJOR = "adding_major"
 STATE_ADDING_TEACHER = "adding_teacher"
@@ -35,13 +62,36 @@ STATE_MANAGE_MAJORS = "manage_majors"
 STATE_MANAGE_STUDENTS = "manage_students"
 STATE_MAJOR = "selected_major"
 STATE_PAGE = "page"
+STATE_PAGE_CURSORS = "page_cursors"
+STATE_REPORT = "report"
+STATE_REPORT_DAYS = "report_days"
 STATE_SELECTED_STUDENTS = "selected_students"
 
+BACKUP_PROGRESS_INTERVAL_SECONDS = 2.0
+EXPORT_LAST_FULL_AT = "last_full_export_at"
+EXPORT_WATERMARK = "watermark"
+
+REPORT_CLASS_DAY = "class_day"
+REPORT_STUDENT_HISTORY = "student_history"
+REPORT_CSV = "csv"
+REPORT_RANGES_DAYS = (7, 30, 90)
+CSV_RANGES_DAYS = (7, 30, 90, 365)
+
+DELETE_DONE = "deleted"
+DELETE_IN_USE = "in_use"
+DELETE_NOT_FOUND = "not_found"
+
 
 @dataclass
 class HandlerContext:
     config: BotConfig
     database: Database
+    authorization: AuthorizationCache
+    rosters: RosterCache
+    report_cache: TtlLruCache
+    edits: EditCoalescer
+    views: RenderedViews
+    catalog: CatalogCache
 
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -151,6 +201,14 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     await update.message.reply_text("Please use the inline menu below.")
 
 
+async def _edit_view(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, text: str, **kwargs: Any
+) -> Any:
+    """Edit the callback's message, skipping the call if nothing would change."""
+    handler_context: HandlerContext = context.bot_data["handler_context"]
+    return await handler_context.views.edit_text(update.callback_query, text, **kwargs)
+
+
 async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if not update.callback_query or not update.effective_user:
         return
@@ -160,229 +218,470 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         await update.callback_query.answer("Unauthorized", show_alert=True)
         return
 
-    data = update.callback_query.data or ""
+    data = CALLBACK_TOKENS.decode(update.callback_query.data or "")
+    if data is None:
+        # The token was evicted or issued before a restart.
+        await update.callback_query.answer(
+            "This menu has expired. Please open it again.", show_alert=True
+        )
+        context.user_data.clear()
+        await _show_main_menu(update, context)
+        return
     await update.callback_query.answer()
 
+    resolved = CALLBACK_ROUTER.resolve(data)
+    if resolved is None:
+        await _edit_view(update, context, "Invalid action. Please use the menu.")
+        return
+
+    route, argument = resolved
+    if route.role == ROLE_MANAGEMENT and not _is_management(
+        update.effective_user.id, handler_context.config
+    ):
+        await _edit_view(update, context, route.denied_message)
+        return
+
+    message = update.callback_query.message
+    if message is not None and route.pattern != TOGGLE_ABSENCE_PREFIX:
+        # A deferred toggle edit must land before anything else touches the
+        # message, e.g. before absence:confirm replaces the keyboard.
+        await handler_context.edits.flush((message.chat_id, message.message_id))
+
     try:
-        if data == "noop":
-            return
-        if data == "menu:main":
-            context.user_data.clear()
-            await _show_main_menu(update, context)
-            return
-        if data == "menu:data":
-            if not _is_management(update.effective_user.id, handler_context.config):
-                await update.callback_query.edit_message_text(
-                    "🚫 You are not authorized to access data tools."
-                )
-                return
-            context.user_data.clear()
-            await _show_data_menu(update, context)
-            return
-        if data == "menu:students":
-            context.user_data.clear()
-            await _show_student_menu(update, context)
-            return
-        if data == "menu:majors":
-            context.user_data.clear()
-            context.user_data[STATE_MANAGE_MAJORS] = "students"
-            await _prompt_grade(
-                update,
-                context,
-                title="Select grade to manage majors",
-                back_target="menu:students",
-            )
-            return
-        if data == "data:students":
-            if not _is_management(update.effective_user.id, handler_context.config):
-                await update.callback_query.edit_message_text(
-                    "🚫 You are not authorized to manage student data."
-                )
-                return
-            context.user_data.clear()
-            await _show_data_students_menu(update, context)
-            return
-        if data == "data:students_manage":
-            if not _is_management(update.effective_user.id, handler_context.config):
-                await update.callback_query.edit_message_text(
-                    "🚫 You are not authorized to manage student data."
-                )
-                return
-            context.user_data.clear()
-            context.user_data[STATE_MANAGE_STUDENTS] = True
-            await _prompt_grade(update, context, title="Select grade to manage students", back_target="data:students")
-            return
-        if data == "data:majors":
-            if not _is_management(update.effective_user.id, handler_context.config):
-                await update.callback_query.edit_message_text(
-                    "🚫 You are not authorized to manage majors."
-                )
-                return
-            context.user_data.clear()
-            context.user_data[STATE_MANAGE_MAJORS] = "data"
-            await _prompt_grade(
-                update,
-                context,
-                title="Select grade to manage majors",
-                back_target="menu:data",
-            )
-            return
-        if data == "data:grades":
-            if not _is_management(update.effective_user.id, handler_context.config):
-                await update.callback_query.edit_message_text(
-                    "🚫 You are not authorized to manage grades."
-                )
-                return
-            context.user_data.clear()
-            context.user_data[STATE_MANAGE_GRADES] = True
-            await _show_grade_management(update, context)
-            return
-        if data == "menu:management":
-            if not _is_management(update.effective_user.id, handler_context.config):
-                await update.callback_query.edit_message_text(
-                    "🚫 You are not authorized to access management tools."
-                )
-                return
-            context.user_data.clear()
-            await _show_management_menu(update, context)
-            return
-        if data == "menu:absence":
-            context.user_data.clear()
-            await _start_absence_flow(update, context)
-            return
-        if data.startswith("students:add"):
-            await _start_add_students(update, context)
-            return
-        if data.startswith("students:view"):
-            await _start_view_students(update, context)
-            return
-        if data.startswith("grade:"):
-            await _handle_grade_selection(update, context, data.split(":", 1)[1])
-            return
-        if data == "major:add":
-            await _start_add_major(update, context)
-            return
-        if data.startswith("major:edit:"):
-            if not _is_management(update.effective_user.id, handler_context.config):
-                await update.callback_query.edit_message_text(
-                    "🚫 You are not authorized to edit majors."
-                )
-                return
-            await _start_edit_major(update, context, data.split(":", 2)[2])
-            return
-        if data.startswith("major:delete:"):
-            await _delete_major(update, context, data.split(":", 2)[2])
-            return
-        if data.startswith("major:select:"):
-            await _handle_major_selection(update, context, data.split(":", 2)[2])
-            return
-        if data.startswith("page:"):
-            await _handle_page(update, context, int(data.split(":", 1)[1]))
-            return
-        if data.startswith("absence:toggle:"):
-            await _toggle_absence_student(update, context, data.split(":", 2)[2])
-            return
-        if data == "absence:confirm":
-            await _confirm_absences(update, context, handler_context)
-            return
-        if data == "absence:cancel":
-            await _start_absence_flow(update, context)
-            return
-        if data == "management:export":
-            if not _is_management(update.effective_user.id, handler_context.config):
-                await update.callback_query.edit_message_text(
-                    "🚫 You are not authorized to export the database."
-                )
-                return
-            await update.callback_query.edit_message_text(
-                "Preparing database export..."
-            )
-            await _send_database_backup(
-                context,
-                handler_context,
-                update.effective_user.id,
-                "📦 Manual database export",
-            )
-            await _show_management_menu(update, context)
-            return
-        if data == "management:add_teacher":
-            if not _is_management(update.effective_user.id, handler_context.config):
-                await update.callback_query.edit_message_text(
-                    "🚫 You are not authorized to manage teachers."
-                )
-                return
-            context.user_data.clear()
-            context.user_data[STATE_ADDING_TEACHER] = True
-            keyboard = build_menu([[simple_button("⬅️ Cancel", "menu:management")]])
-            await update.callback_query.edit_message_text(
-                "Send the teacher's Telegram user ID (numbers only).",
-                reply_markup=keyboard,
-            )
-            return
-        if data == "grade:add":
-            if not _is_management(update.effective_user.id, handler_context.config):
-                await update.callback_query.edit_message_text(
-                    "🚫 You are not authorized to manage grades."
-                )
-                return
-            await _start_add_grade(update, context)
-            return
-        if data.startswith("grade:delete:"):
-            if not _is_management(update.effective_user.id, handler_context.config):
-                await update.callback_query.edit_message_text(
-                    "🚫 You are not authorized to manage grades."
-                )
-                return
-            await _delete_grade(update, context, data.split(":", 2)[2])
-            return
-        if data.startswith("grade:edit:"):
-            if not _is_management(update.effective_user.id, handler_context.config):
-                await update.callback_query.edit_message_text(
-                    "🚫 You are not authorized to manage grades."
-                )
-                return
-            await _start_edit_grade(update, context, data.split(":", 2)[2])
-            return
-        if data.startswith("student:manage:"):
-            if not _is_management(update.effective_user.id, handler_context.config):
-                await update.callback_query.edit_message_text(
-                    "🚫 You are not authorized to manage students."
-                )
-                return
-            await _show_student_management_actions(update, context, data.split(":", 2)[2])
-            return
-        if data.startswith("student:edit:"):
-            if not _is_management(update.effective_user.id, handler_context.config):
-                await update.callback_query.edit_message_text(
-                    "🚫 You are not authorized to manage students."
-                )
-                return
-            await _start_edit_student(update, context, data.split(":", 2)[2])
-            return
-        if data.startswith("student:delete:"):
-            if not _is_management(update.effective_user.id, handler_context.config):
-                await update.callback_query.edit_message_text(
-                    "🚫 You are not authorized to manage students."
-                )
-                return
-            await _delete_student(update, context, data.split(":", 2)[2])
-            return
-        if data == "students:manage":
-            if not _is_management(update.effective_user.id, handler_context.config):
-                await update.callback_query.edit_message_text(
-                    "🚫 You are not authorized to manage students."
-                )
-                return
-            await _show_student_management_list(update, context)
-            return
+        await CALLBACK_ROUTER.dispatch(route, update, context, argument)
     except Exception as exc:  # noqa: BLE001
         LOGGER.exception("Error handling callback: %s", exc)
-        await update.callback_query.edit_message_text(
-            "An unexpected error occurred. Please try again or contact support."
+        await _edit_view(
+            update, context, "An unexpected error occurred. Please try again or contact support."
         )
-        return
 
-    await update.callback_query.edit_message_text("Invalid action. Please use the menu.")
+
+CALLBACK_ROUTER = CallbackRouter()
+CALLBACK_TOKENS = CallbackTokens()
+TOGGLE_ABSENCE_PREFIX = "absence:toggle:"
+
+
+def _callback_data(prefix: str, argument: str) -> str:
+    """Callback data for a route taking a name or id, kept under 64 bytes."""
+    return CALLBACK_TOKENS.encode(prefix + argument)
+
+
+@CALLBACK_ROUTER.exact("noop")
+async def _route_noop(update: Update, context: ContextTypes.DEFAULT_TYPE, argument: str) -> None:
+    return
+
+
+@CALLBACK_ROUTER.exact("menu:main")
+async def _route_main_menu(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, argument: str
+) -> None:
+    context.user_data.clear()
+    await _show_main_menu(update, context)
+
+
+@CALLBACK_ROUTER.exact(
+    "menu:data", role=ROLE_MANAGEMENT, denied="🚫 You are not authorized to access data tools."
+)
+async def _route_data_menu(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, argument: str
+) -> None:
+    context.user_data.clear()
+    await _show_data_menu(update, context)
+
+
+@CALLBACK_ROUTER.exact("menu:students")
+async def _route_student_menu(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, argument: str
+) -> None:
+    context.user_data.clear()
+    await _show_student_menu(update, context)
+
+
+@CALLBACK_ROUTER.exact("menu:majors")
+async def _route_majors_menu(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, argument: str
+) -> None:
+    context.user_data.clear()
+    context.user_data[STATE_MANAGE_MAJORS] = "students"
+    await _prompt_grade(
+        update,
+        context,
+        title="Select grade to manage majors",
+        back_target="menu:students",
+    )
+
+
+@CALLBACK_ROUTER.exact(
+    "data:students",
+    role=ROLE_MANAGEMENT,
+    denied="🚫 You are not authorized to manage student data.",
+)
+async def _route_data_students(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, argument: str
+) -> None:
+    context.user_data.clear()
+    await _show_data_students_menu(update, context)
+
+
+@CALLBACK_ROUTER.exact(
+    "data:students_manage",
+    role=ROLE_MANAGEMENT,
+    denied="🚫 You are not authorized to manage student data.",
+)
+async def _route_data_students_manage(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, argument: str
+) -> None:
+    context.user_data.clear()
+    context.user_data[STATE_MANAGE_STUDENTS] = True
+    await _prompt_grade(update, context, title="Select grade to manage students", back_target="data:students")
+
+
+@CALLBACK_ROUTER.exact(
+    "data:majors", role=ROLE_MANAGEMENT, denied="🚫 You are not authorized to manage majors."
+)
+async def _route_data_majors(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, argument: str
+) -> None:
+    context.user_data.clear()
+    context.user_data[STATE_MANAGE_MAJORS] = "data"
+    await _prompt_grade(
+        update,
+        context,
+        title="Select grade to manage majors",
+        back_target="menu:data",
+    )
+
+
+@CALLBACK_ROUTER.exact(
+    "data:grades", role=ROLE_MANAGEMENT, denied="🚫 You are not authorized to manage grades."
+)
+async def _route_data_grades(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, argument: str
+) -> None:
+    context.user_data.clear()
+    context.user_data[STATE_MANAGE_GRADES] = True
+    await _show_grade_management(update, context)
+
+
+@CALLBACK_ROUTER.exact(
+    "menu:management",
+    role=ROLE_MANAGEMENT,
+    denied="🚫 You are not authorized to access management tools.",
+)
+async def _route_management_menu(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, argument: str
+) -> None:
+    context.user_data.clear()
+    await _show_management_menu(update, context)
+
+
+@CALLBACK_ROUTER.exact("menu:absence")
+@CALLBACK_ROUTER.exact("absence:cancel")
+async def _route_absence_flow(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, argument: str
+) -> None:
+    await _start_absence_flow(update, context)
+
+
+@CALLBACK_ROUTER.exact("students:add")
+async def _route_add_students(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, argument: str
+) -> None:
+    await _start_add_students(update, context)
+
+
+@CALLBACK_ROUTER.exact("students:view")
+async def _route_view_students(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, argument: str
+) -> None:
+    await _start_view_students(update, context)
+
+
+@CALLBACK_ROUTER.exact(
+    "students:manage", role=ROLE_MANAGEMENT, denied="🚫 You are not authorized to manage students."
+)
+async def _route_manage_students(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, argument: str
+) -> None:
+    await _show_student_management_list(update, context)
+
+
+@CALLBACK_ROUTER.prefix("grade:select:")
+async def _route_grade_selection(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, argument: str
+) -> None:
+    await _handle_grade_selection(update, context, argument)
+
+
+@CALLBACK_ROUTER.exact(
+    "grade:add", role=ROLE_MANAGEMENT, denied="🚫 You are not authorized to manage grades."
+)
+async def _route_add_grade(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, argument: str
+) -> None:
+    await _start_add_grade(update, context)
+
+
+@CALLBACK_ROUTER.prefix(
+    "grade:edit:", role=ROLE_MANAGEMENT, denied="🚫 You are not authorized to manage grades."
+)
+async def _route_edit_grade(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, argument: str
+) -> None:
+    await _start_edit_grade(update, context, argument)
+
+
+@CALLBACK_ROUTER.prefix(
+    "grade:delete:", role=ROLE_MANAGEMENT, denied="🚫 You are not authorized to manage grades."
+)
+async def _route_delete_grade(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, argument: str
+) -> None:
+    await _delete_grade(update, context, argument)
+
+
+@CALLBACK_ROUTER.exact("major:add")
+async def _route_add_major(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, argument: str
+) -> None:
+    await _start_add_major(update, context)
+
+
+@CALLBACK_ROUTER.prefix(
+    "major:edit:", role=ROLE_MANAGEMENT, denied="🚫 You are not authorized to edit majors."
+)
+async def _route_edit_major(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, argument: str
+) -> None:
+    await _start_edit_major(update, context, argument)
+
+
+@CALLBACK_ROUTER.prefix("major:delete:")
+async def _route_delete_major(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, argument: str
+) -> None:
+    await _delete_major(update, context, argument)
+
+
+@CALLBACK_ROUTER.prefix("major:select:")
+async def _route_major_selection(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, argument: str
+) -> None:
+    await _handle_major_selection(update, context, argument)
+
+
+@CALLBACK_ROUTER.prefix("page:")
+async def _route_page(update: Update, context: ContextTypes.DEFAULT_TYPE, argument: str) -> None:
+    await _handle_page(update, context, int(argument))
+
+
+@CALLBACK_ROUTER.prefix(TOGGLE_ABSENCE_PREFIX)
+async def _route_toggle_absence(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, argument: str
+) -> None:
+    await _toggle_absence_student(update, context, argument)
+
+
+@CALLBACK_ROUTER.exact("absence:confirm")
+async def _route_confirm_absences(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, argument: str
+) -> None:
+    await _confirm_absences(update, context, context.bot_data["handler_context"])
+
+
+@CALLBACK_ROUTER.exact(
+    "management:export",
+    role=ROLE_MANAGEMENT,
+    denied="🚫 You are not authorized to export the database.",
+)
+async def _route_export(update: Update, context: ContextTypes.DEFAULT_TYPE, argument: str) -> None:
+    status_message = await _edit_view(
+        update, context, "Preparing database export..."
+    )
+    await _send_database_backup(
+        context,
+        context.bot_data["handler_context"],
+        [update.effective_user.id],
+        "📦 Manual database export",
+        status_message if isinstance(status_message, Message) else None,
+    )
+    # The progress updates edited the message behind the view cache's back.
+    message = update.callback_query.message
+    if message is not None:
+        context.bot_data["handler_context"].views.forget((message.chat_id, message.message_id))
+    await _show_management_menu(update, context)
+
+
+@CALLBACK_ROUTER.exact(
+    "menu:reports", role=ROLE_MANAGEMENT, denied="🚫 You are not authorized to view reports."
+)
+async def _route_reports_menu(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, argument: str
+) -> None:
+    context.user_data.clear()
+    await _show_reports_menu(update, context)
+
+
+@CALLBACK_ROUTER.exact(
+    "report:class", role=ROLE_MANAGEMENT, denied="🚫 You are not authorized to view reports."
+)
+async def _route_report_class(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, argument: str
+) -> None:
+    context.user_data.clear()
+    context.user_data[STATE_REPORT] = REPORT_CLASS_DAY
+    await _prompt_grade(update, context, title="Select grade for the report", back_target="menu:reports")
+
+
+@CALLBACK_ROUTER.prefix(
+    "report:day:", role=ROLE_MANAGEMENT, denied="🚫 You are not authorized to view reports."
+)
+async def _route_report_day(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, argument: str
+) -> None:
+    await _show_class_day_report(update, context, date.fromisoformat(argument))
+
+
+@CALLBACK_ROUTER.prefix(
+    "report:top:", role=ROLE_MANAGEMENT, denied="🚫 You are not authorized to view reports."
+)
+async def _route_report_top(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, argument: str
+) -> None:
+    await _show_top_absentees(update, context, int(argument))
+
+
+@CALLBACK_ROUTER.prefix(
+    "report:classes:", role=ROLE_MANAGEMENT, denied="🚫 You are not authorized to view reports."
+)
+async def _route_report_classes(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, argument: str
+) -> None:
+    await _show_class_totals(update, context, int(argument))
+
+
+@CALLBACK_ROUTER.exact(
+    "report:student", role=ROLE_MANAGEMENT, denied="🚫 You are not authorized to view reports."
+)
+async def _route_report_student(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, argument: str
+) -> None:
+    context.user_data.clear()
+    context.user_data[STATE_REPORT] = REPORT_STUDENT_HISTORY
+    await _prompt_grade(update, context, title="Select the student's grade", back_target="menu:reports")
+
+
+@CALLBACK_ROUTER.prefix(
+    "report:history:", role=ROLE_MANAGEMENT, denied="🚫 You are not authorized to view reports."
+)
+async def _route_report_history(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, argument: str
+) -> None:
+    await _show_student_history(update, context, argument)
+
+
+@CALLBACK_ROUTER.exact(
+    "report:csv", role=ROLE_MANAGEMENT, denied="🚫 You are not authorized to export absences."
+)
+async def _route_report_csv(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, argument: str
+) -> None:
+    context.user_data.clear()
+    context.user_data[STATE_REPORT] = REPORT_CSV
+    await _show_csv_ranges(update, context)
+
+
+@CALLBACK_ROUTER.prefix(
+    "csv:range:", role=ROLE_MANAGEMENT, denied="🚫 You are not authorized to export absences."
+)
+async def _route_csv_range(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, argument: str
+) -> None:
+    context.user_data[STATE_REPORT] = REPORT_CSV
+    context.user_data[STATE_REPORT_DAYS] = int(argument)
+    keyboard = build_menu(
+        [
+            [simple_button("🌐 All Classes", "csv:all")],
+            [simple_button("🏫 Choose Grade/Major", "csv:class")],
+            [simple_button("⬅️ Back", "report:csv")],
+        ]
+    )
+    await _edit_view(
+        update, context, "Which classes should the export include?", reply_markup=keyboard
+    )
+
+
+@CALLBACK_ROUTER.exact(
+    "csv:class", role=ROLE_MANAGEMENT, denied="🚫 You are not authorized to export absences."
+)
+async def _route_csv_class(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, argument: str
+) -> None:
+    await _prompt_grade(update, context, title="Select grade to export", back_target="report:csv")
+
+
+@CALLBACK_ROUTER.exact(
+    "csv:all", role=ROLE_MANAGEMENT, denied="🚫 You are not authorized to export absences."
+)
+async def _route_csv_all(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, argument: str
+) -> None:
+    await _send_absences_csv(update, context, None, None)
+
+
+@CALLBACK_ROUTER.exact(
+    "csv:grade", role=ROLE_MANAGEMENT, denied="🚫 You are not authorized to export absences."
+)
+async def _route_csv_grade(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, argument: str
+) -> None:
+    await _send_absences_csv(update, context, context.user_data.get(STATE_GRADE), None)
+
+
+@CALLBACK_ROUTER.exact(
+    "management:add_teacher",
+    role=ROLE_MANAGEMENT,
+    denied="🚫 You are not authorized to manage teachers.",
+)
+async def _route_add_teacher(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, argument: str
+) -> None:
+    context.user_data.clear()
+    context.user_data[STATE_ADDING_TEACHER] = True
+    keyboard = build_menu([[simple_button("⬅️ Cancel", "menu:management")]])
+    await _edit_view(
+        update,
+        context,
+        "Send the teacher's Telegram user ID (numbers only).",
+        reply_markup=keyboard,
+    )
+
+
+@CALLBACK_ROUTER.prefix(
+    "student:manage:", role=ROLE_MANAGEMENT, denied="🚫 You are not authorized to manage students."
+)
+async def _route_student_actions(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, argument: str
+) -> None:
+    await _show_student_management_actions(update, context, argument)
+
+
+@CALLBACK_ROUTER.prefix(
+    "student:edit:", role=ROLE_MANAGEMENT, denied="🚫 You are not authorized to manage students."
+)
+async def _route_edit_student(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, argument: str
+) -> None:
+    await _start_edit_student(update, context, argument)
+
+
+@CALLBACK_ROUTER.prefix(
+    "student:delete:", role=ROLE_MANAGEMENT, denied="🚫 You are not authorized to manage students."
+)
+async def _route_delete_student(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, argument: str
+) -> None:
+    await _delete_student(update, context, argument)
 
 
 async def _show_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -408,7 +707,7 @@ async def _show_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     if update.message:
         await update.message.reply_text("Welcome! Choose an option:", reply_markup=keyboard)
     else:
-        await update.callback_query.edit_message_text("Main Menu:", reply_markup=keyboard)
+        await _edit_view(update, context, "Main Menu:", reply_markup=keyboard)
 
 
 async def _show_student_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -420,7 +719,7 @@ async def _show_student_menu(update: Update, context: ContextTypes.DEFAULT_TYPE)
             [simple_button("⬅️ Back", "menu:main")],
         ]
     )
-    await update.callback_query.edit_message_text("Student Management:", reply_markup=keyboard)
+    await _edit_view(update, context, "Student Management:", reply_markup=keyboard)
 
 
 async def _show_data_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -432,32 +731,239 @@ async def _show_data_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             [simple_button("⬅️ Back", "menu:main")],
         ]
     )
-    await update.callback_query.edit_message_text("Data Management:", reply_markup=keyboard)
+    await _edit_view(update, context, "Data Management:", reply_markup=keyboard)
+
+
+async def _show_data_students_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    keyboard = build_menu(
+        [
+            [simple_button("➕ Add Students", "students:add")],
+            [simple_button("✏️ Edit/Delete Students", "data:students_manage")],
+            [simple_button("⬅️ Back", "menu:data")],
+        ]
+    )
+    await _edit_view(update, context, "Student Data:", reply_markup=keyboard)
+
+
+async def _show_management_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    keyboard = build_menu(
+        [
+            [
+                simple_button("📤 Export Database", "management:export"),
+                simple_button("📊 Reports", "menu:reports"),
+            ],
+            [simple_button("➕ Add Teacher ID", "management:add_teacher")],
+            [simple_button("⬅️ Back", "menu:main")],
+        ]
+    )
+    if update.callback_query:
+        await _edit_view(update, context, "Management Tools:", reply_markup=keyboard)
+    else:
+        await update.message.reply_text("Management Tools:", reply_markup=keyboard)
+
+
+async def _show_reports_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    keyboard = build_menu(
+        [
+            [simple_button("🏫 Class on a Date", "report:class")],
+            [
+                simple_button(f"🏆 Top Absentees ({days}d)", f"report:top:{days}")
+                for days in REPORT_RANGES_DAYS
+            ],
+            [
+                simple_button(f"📊 Class Totals ({days}d)", f"report:classes:{days}")
+                for days in REPORT_RANGES_DAYS
+            ],
+            [simple_button("🧑‍🎓 Student History", "report:student")],
+            [simple_button("📄 Export Absences CSV", "report:csv")],
+            [simple_button("⬅️ Back", "menu:management")],
+        ]
+    )
+    await _edit_view(update, context, "Reports:", reply_markup=keyboard)
+
+
+async def _fetch_report(
+    handler_context: HandlerContext, report: Callable[..., T], *params: Any
+) -> T:
+    """Run a report query, sharing the result until the next absence write."""
+    cache = handler_context.report_cache
+    key = (report.__name__, *params)
+    result = cache.get(key)
+    if result is None:
+        generation = cache.generation
+        result = await run_in_session(handler_context.database, report, *params)
+        cache.put(key, result, generation)
+    return result
+
+
+def _today(handler_context: HandlerContext) -> date:
+    return datetime.now(ZoneInfo(handler_context.config.timezone)).date()
+
+
+async def _show_class_day_report(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, day: date
+) -> None:
+    handler_context: HandlerContext = context.bot_data["handler_context"]
+    grade = context.user_data.get(STATE_GRADE)
+    major = context.user_data.get(STATE_MAJOR)
+    if not grade or not major:
+        await _edit_view(update, context, "Please select grade and major.")
+        return
+
+    names = await _fetch_report(handler_context, reports.class_on_date, grade, major, day)
+    lines = [f"🏫 {grade} - {major}, {day:%A %Y-%m-%d}"]
+    if names:
+        lines.append(f"{len(names)} absent:")
+        lines.extend(f"• {name}" for name in names)
+    else:
+        lines.append("No absences recorded.")
+
+    navigation = [
+        simple_button("⏪ Week", f"report:day:{day - timedelta(days=7)}"),
+        simple_button("◀️ Day", f"report:day:{day - timedelta(days=1)}"),
+    ]
+    if day < _today(handler_context):
+        navigation.append(simple_button("Day ▶️", f"report:day:{day + timedelta(days=1)}"))
+    keyboard = build_menu([navigation, [simple_button("⬅️ Back", "menu:reports")]])
+    await _edit_view(update, context, "\n".join(lines), reply_markup=keyboard)
+
+
+async def _show_top_absentees(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, days: int
+) -> None:
+    handler_context: HandlerContext = context.bot_data["handler_context"]
+    end = _today(handler_context)
+    start = end - timedelta(days=days - 1)
+    absentees = await _fetch_report(handler_context, reports.top_absentees, start, end)
+    lines = [f"🏆 Top absentees, {start} to {end}:"]
+    if absentees:
+        lines.extend(
+            f"{rank}. {absentee.full_name} ({absentee.grade} - {absentee.major}): "
+            f"{absentee.absences}"
+            for rank, absentee in enumerate(absentees, start=1)
+        )
+    else:
+        lines.append("No absences recorded.")
+    keyboard = build_menu([[simple_button("⬅️ Back", "menu:reports")]])
+    await _edit_view(update, context, "\n".join(lines), reply_markup=keyboard)
+
+
+async def _show_class_totals(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, days: int
+) -> None:
+    handler_context: HandlerContext = context.bot_data["handler_context"]
+    end = _today(handler_context)
+    start = end - timedelta(days=days - 1)
+    totals = await _fetch_report(handler_context, rollups.class_totals, start, end)
+    lines = [f"📊 Absences per class, {start} to {end}:"]
+    if totals:
+        lines.extend(f"• {grade} - {major}: {absences}" for grade, major, absences in totals)
+    else:
+        lines.append("No absences recorded.")
+    keyboard = build_menu([[simple_button("⬅️ Back", "menu:reports")]])
+    await _edit_view(update, context, "\n".join(lines), reply_markup=keyboard)
+
+
+async def _show_report_student_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    handler_context: HandlerContext = context.bot_data["handler_context"]
+    grade = context.user_data.get(STATE_GRADE)
+    major = context.user_data.get(STATE_MAJOR)
+    if not grade or not major:
+        await _edit_view(update, context, "Please select grade and major.")
+        return
+
+    page, roster_page, page_count = await _load_roster_page(
+        handler_context, context, grade, major
+    )
+    if not roster_page.entries:
+        await _edit_view(
+            update,
+            context,
+            "No students found for this class.",
+            reply_markup=build_menu([[simple_button("⬅️ Back", "menu:reports")]]),
+        )
+        return
+
+    items = [
+        InlineKeyboardButton(
+            student.full_name, callback_data=_callback_data("report:history:", student.id)
+        )
+        for student in roster_page.entries
+    ]
+    keyboard = page_buttons(
+        items, page, roster_page.has_next, "menu:reports", page_count=page_count
+    )
+    await _edit_view(
+        update, context, f"Select a student in {grade} - {major}:", reply_markup=keyboard
+    )
+
+
+async def _show_student_history(
+    update: Update, context: ContextTypes.DEFAULT_TYPE, student_id: str
+) -> None:
+    handler_context: HandlerContext = context.bot_data["handler_context"]
+    history = await _fetch_report(handler_context, reports.student_history, student_id)
+    back = build_menu([[simple_button("⬅️ Back", "menu:reports")]])
+    if history is None:
+        await _edit_view(update, context, "Student not found.", reply_markup=back)
+        return
 
+    lines = [
+        f"🧑‍🎓 {history.full_name} ({history.grade} - {history.major})",
+        f"Total absences: {history.total}",
+    ]
+    if history.recent:
+        if history.total > len(history.recent):
+            lines.append(f"Most recent {len(history.recent)}:")
+        lines.extend(f"• {day:%a %Y-%m-%d}" for day in history.recent)
+    await _edit_view(update, context, "\n".join(lines), reply_markup=back)
 
-async def _show_data_students_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+
+async def _show_csv_ranges(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     keyboard = build_menu(
         [
-            [simple_button("➕ Add Students", "students:add")],
-            [simple_button("✏️ Edit/Delete Students", "data:students_manage")],
-            [simple_button("⬅️ Back", "menu:data")],
+            [simple_button(f"Last {days} days", f"csv:range:{days}") for days in CSV_RANGES_DAYS],
+            [simple_button("All time", "csv:range:0")],
+            [simple_button("⬅️ Back", "menu:reports")],
         ]
     )
-    await update.callback_query.edit_message_text("Student Data:", reply_markup=keyboard)
+    await _edit_view(
+        update, context, "Export absences as CSV. Choose a date range:", reply_markup=keyboard
+    )
 
 
-async def _show_management_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    keyboard = build_menu(
-        [
-            [simple_button("📤 Export Database", "management:export")],
-            [simple_button("➕ Add Teacher ID", "management:add_teacher")],
-            [simple_button("⬅️ Back", "menu:main")],
-        ]
+async def _send_absences_csv(
+    update: Update,
+    context: ContextTypes.DEFAULT_TYPE,
+    grade: Optional[str],
+    major: Optional[str],
+) -> None:
+    handler_context: HandlerContext = context.bot_data["handler_context"]
+    days = context.user_data.get(STATE_REPORT_DAYS, 0)
+    end = _today(handler_context)
+    start = end - timedelta(days=days - 1) if days else None
+    await _edit_view(update, context, "Preparing absences CSV...")
+
+    path, rows = await run_in_session(
+        handler_context.database, reports.write_absences_csv, start, end, grade, major
     )
-    if update.callback_query:
-        await update.callback_query.edit_message_text("Management Tools:", reply_markup=keyboard)
-    else:
-        await update.message.reply_text("Management Tools:", reply_markup=keyboard)
+    scope = " - ".join(part for part in (grade, major) if part) or "all classes"
+    period = f"{start} to {end}" if start else f"up to {end}"
+    name_parts = ["absences", str(start or "all"), str(end), grade, major]
+    filename = "_".join(part.replace(" ", "-") for part in name_parts if part) + ".csv.gz"
+    try:
+        with path.open("rb") as export_file:
+            await context.bot.send_document(
+                chat_id=update.effective_user.id,
+                document=export_file,
+                filename=filename,
+                caption=f"📄 Absences for {scope}, {period}: {rows} row(s)",
+            )
+    finally:
+        path.unlink(missing_ok=True)
+
+    context.user_data.clear()
+    await _show_reports_menu(update, context)
 
 
 async def _start_add_students(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -484,17 +990,25 @@ async def _prompt_grade(
     back_target: str = "menu:main",
 ) -> None:
     handler_context: HandlerContext = context.bot_data["handler_context"]
-    grades = _fetch_grades(handler_context)
+    grades = await _fetch_grades(handler_context)
     if not grades:
-        await update.callback_query.edit_message_text(
+        await _edit_view(
+            update,
+            context,
             "No grades configured yet. Ask a manager to add grades first.",
             reply_markup=build_menu([[simple_button("⬅️ Back", back_target)]]),
         )
         return
-    rows = [[simple_button(grade, f"grade:{grade}")] for grade in grades]
-    rows.append([simple_button("⬅️ Back", back_target)])
-    keyboard = build_menu(rows)
-    await update.callback_query.edit_message_text(title, reply_markup=keyboard)
+
+    def build() -> InlineKeyboardMarkup:
+        rows = [[simple_button(grade, _callback_data("grade:select:", grade))] for grade in grades]
+        rows.append([simple_button("⬅️ Back", back_target)])
+        return build_menu(rows)
+
+    keyboard = handler_context.catalog.markup(
+        ("grades", back_target), build, CALLBACK_TOKENS.retain
+    )
+    await _edit_view(update, context, title, reply_markup=keyboard)
 
 
 async def _handle_grade_selection(
@@ -502,70 +1016,164 @@ async def _handle_grade_selection(
 ) -> None:
     context.user_data[STATE_GRADE] = grade
     context.user_data[STATE_PAGE] = 0
+    context.user_data.pop(STATE_PAGE_CURSORS, None)
 
     if context.user_data.get(STATE_MANAGE_MAJORS):
         await _show_major_management(update, context)
         return
 
     handler_context: HandlerContext = context.bot_data["handler_context"]
-    majors = _fetch_majors(handler_context, grade)
+    majors = await _fetch_majors(handler_context, grade)
     if not majors:
         back_target = "data:students" if context.user_data.get(STATE_MANAGE_STUDENTS) else "menu:main"
-        await update.callback_query.edit_message_text(
+        await _edit_view(
+            update,
+            context,
             "No majors configured for this grade. Use Manage Majors to add them.",
             reply_markup=build_menu([[simple_button("⬅️ Back", back_target)]]),
         )
         return
 
-    rows = [[simple_button(major, f"major:select:{major}")] for major in majors]
-    rows.append([simple_button("⬅️ Back", "menu:main")])
-    keyboard = build_menu(rows)
-    await update.callback_query.edit_message_text("Select major:", reply_markup=keyboard)
+    whole_grade = context.user_data.get(STATE_REPORT) == REPORT_CSV
+
+    def build() -> InlineKeyboardMarkup:
+        rows = [[simple_button(major, _callback_data("major:select:", major))] for major in majors]
+        if whole_grade:
+            rows.append([simple_button("🌐 All Majors", "csv:grade")])
+        rows.append([simple_button("⬅️ Back", "menu:main")])
+        return build_menu(rows)
+
+    keyboard = handler_context.catalog.markup(
+        ("majors", grade, whole_grade), build, CALLBACK_TOKENS.retain
+    )
+    await _edit_view(update, context, "Select major:", reply_markup=keyboard)
+
+
+async def _load_catalog(handler_context: HandlerContext) -> Catalog:
+    """Grades and majors, re-read only when ``catalog_version`` has moved."""
+    cache = handler_context.catalog
+    catalog = await run_in_session(handler_context.database, _query_catalog, cache.version)
+    if catalog is None:
+        cache.hits += 1
+    else:
+        cache.misses += 1
+        cache.load(catalog)
+    return cache.catalog
+
+
+def _query_catalog(session: Session, known_version: Optional[int]) -> Optional[Catalog]:
+    # Read the version first: a write landing before the lists are read then
+    # only costs an extra reload, never a stale catalog under a new version.
+    version = queries.catalog_version(session)
+    if version == known_version:
+        return None
+    return Catalog(
+        version=version,
+        grades=queries.grade_names(session),
+        majors=queries.majors_by_grade(session),
+    )
+
+
+async def _fetch_majors(handler_context: HandlerContext, grade: str) -> tuple[str, ...]:
+    return (await _load_catalog(handler_context)).majors.get(grade, ())
+
+
+async def _fetch_grades(handler_context: HandlerContext) -> tuple[str, ...]:
+    return (await _load_catalog(handler_context)).grades
 
 
-def _fetch_majors(handler_context: HandlerContext, grade: str) -> list[str]:
-    with session_scope(handler_context.database) as session:
-        majors = (
-            session.query(Major)
-            .filter(Major.grade == grade)
-            .order_by(Major.name.asc())
-            .all()
+async def _load_roster_page(
+    handler_context: HandlerContext,
+    context: ContextTypes.DEFAULT_TYPE,
+    grade: str,
+    major: str,
+) -> tuple[int, RosterPage, int]:
+    """Fetch the current page of a class roster with keyset pagination.
+
+    ``STATE_PAGE_CURSORS`` holds the ``(full_name, id)`` key preceding each
+    page reached so far, so any page costs one ``LIMIT page_size + 1`` query
+    no matter how deep it is. Returns the page number actually shown, the
+    page and the total number of pages.
+    """
+    page = context.user_data.get(STATE_PAGE, 0)
+    cursors: list = context.user_data.setdefault(STATE_PAGE_CURSORS, [None])
+    if page >= len(cursors):
+        page = 0
+    roster_page = await _fetch_roster_page(handler_context, grade, major, cursors[page])
+    if not roster_page.entries and page > 0:
+        page = 0
+        roster_page = await _fetch_roster_page(handler_context, grade, major, None)
+
+    if roster_page.has_next:
+        last = roster_page.entries[-1]
+        cursors[page + 1 : page + 2] = [(last.full_name, last.id)]
+    else:
+        del cursors[page + 1 :]
+    context.user_data[STATE_PAGE] = page
+
+    size = await _fetch_roster_size(handler_context, grade, major)
+    page_size = handler_context.config.page_size
+    return page, roster_page, max((size + page_size - 1) // page_size, 1)
+
+
+async def _fetch_roster_page(
+    handler_context: HandlerContext,
+    grade: str,
+    major: str,
+    after: Optional[tuple[str, str]],
+) -> RosterPage:
+    rosters = handler_context.rosters
+    key = (grade, major, "page", after)
+    roster_page = rosters.get(key)
+    if roster_page is None:
+        generation = rosters.generation
+        roster_page = await run_in_session(
+            handler_context.database,
+            queries.roster_page,
+            grade,
+            major,
+            after,
+            handler_context.config.page_size,
         )
-    return [major.name for major in majors]
+        rosters.put(key, roster_page, generation)
+    return roster_page
 
 
-def _fetch_grades(handler_context: HandlerContext) -> list[str]:
-    with session_scope(handler_context.database) as session:
-        grades = session.query(Grade).order_by(Grade.name.asc()).all()
-    if grades:
-        return [grade.name for grade in grades]
-    return []
+async def _fetch_roster_size(handler_context: HandlerContext, grade: str, major: str) -> int:
+    rosters = handler_context.rosters
+    key = (grade, major, "size")
+    size = rosters.get(key)
+    if size is None:
+        generation = rosters.generation
+        size = await run_in_session(handler_context.database, queries.roster_size, grade, major)
+        rosters.put(key, size, generation)
+    return size
 
 
 async def _show_major_management(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     handler_context: HandlerContext = context.bot_data["handler_context"]
     grade = context.user_data.get(STATE_GRADE)
     if not grade:
-        await update.callback_query.edit_message_text("Please select a grade first.")
+        await _edit_view(update, context, "Please select a grade first.")
         return
 
     show_edit = bool(
         update.effective_user
         and _is_management(update.effective_user.id, handler_context.config)
     )
-    majors = _fetch_majors(handler_context, grade)
+    majors = await _fetch_majors(handler_context, grade)
     rows = []
     if majors:
         for major in majors:
             if show_edit:
                 rows.append(
                     [
-                        simple_button(f"✏️ {major}", f"major:edit:{major}"),
-                        simple_button(f"🗑️ {major}", f"major:delete:{major}"),
+                        simple_button(f"✏️ {major}", _callback_data("major:edit:", major)),
+                        simple_button(f"🗑️ {major}", _callback_data("major:delete:", major)),
                     ]
                 )
             else:
-                rows.append([simple_button(f"🗑️ {major}", f"major:delete:{major}")])
+                rows.append([simple_button(f"🗑️ {major}", _callback_data("major:delete:", major))])
     rows.append([simple_button("➕ Add Major", "major:add")])
     source = context.user_data.get(STATE_MANAGE_MAJORS)
     back_target = "menu:data" if source == "data" else "menu:students"
@@ -573,7 +1181,7 @@ async def _show_major_management(update: Update, context: ContextTypes.DEFAULT_T
     keyboard = build_menu(rows)
     message = f"Manage majors for {grade}:"
     if update.callback_query:
-        await update.callback_query.edit_message_text(message, reply_markup=keyboard)
+        await _edit_view(update, context, message, reply_markup=keyboard)
     else:
         await update.message.reply_text(message, reply_markup=keyboard)
 
@@ -583,7 +1191,9 @@ async def _start_add_major(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     source = context.user_data.get(STATE_MANAGE_MAJORS)
     back_target = "menu:data" if source == "data" else "menu:students"
     keyboard = build_menu([[simple_button("⬅️ Cancel", back_target)]])
-    await update.callback_query.edit_message_text(
+    await _edit_view(
+        update,
+        context,
         "Send the new major name.",
         reply_markup=keyboard,
     )
@@ -596,7 +1206,9 @@ async def _start_edit_major(
     source = context.user_data.get(STATE_MANAGE_MAJORS)
     back_target = "menu:data" if source == "data" else "menu:students"
     keyboard = build_menu([[simple_button("⬅️ Cancel", back_target)]])
-    await update.callback_query.edit_message_text(
+    await _edit_view(
+        update,
+        context,
         f"Send the new name for major: {major}",
         reply_markup=keyboard,
     )
@@ -615,22 +1227,38 @@ async def _handle_major_input(
         await update.message.reply_text("Please send a valid major name.")
         return
 
-    with session_scope(handler_context.database) as session:
-        existing = (
-            session.query(Major)
-            .filter(Major.grade == grade, Major.name == major)
-            .first()
-        )
-        if existing:
-            await update.message.reply_text("That major already exists for this grade.")
-            return
-        session.add(Major(grade=grade, name=major))
+    added = await run_in_session(handler_context.database, _insert_major, grade, major)
+    if added is None:
+        # The grade was deleted while this prompt was open.
+        context.user_data.clear()
+        await update.message.reply_text("Grade not found.")
+        await _show_main_menu(update, context)
+        return
+    if not added:
+        await update.message.reply_text("That major already exists for this grade.")
+        return
 
     context.user_data.pop(STATE_ADDING_MAJOR, None)
     await update.message.reply_text(f"Added major: {major}")
     await _show_major_management(update, context)
 
 
+def _insert_major(session: Session, grade: str, major: str) -> Optional[bool]:
+    # False when the major already exists, None when the grade does not.
+    grade_record = session.query(Grade).filter(Grade.name == grade).first()
+    if not grade_record:
+        return None
+    existing = (
+        session.query(Major)
+        .filter(Major.grade_id == grade_record.id, Major.name == major)
+        .first()
+    )
+    if existing:
+        return False
+    session.add(Major(grade_id=grade_record.id, name=major))
+    return True
+
+
 async def _handle_major_edit(
     update: Update, context: ContextTypes.DEFAULT_TYPE, handler_context: HandlerContext
 ) -> None:
@@ -645,33 +1273,38 @@ async def _handle_major_edit(
         await update.message.reply_text("Please send a valid major name.")
         return
 
-    with session_scope(handler_context.database) as session:
-        record = (
-            session.query(Major)
-            .filter(Major.grade == grade, Major.name == old_major)
-            .first()
-        )
-        if not record:
-            await update.message.reply_text("Major not found.")
-            return
-        existing = (
-            session.query(Major)
-            .filter(Major.grade == grade, Major.name == new_major)
-            .first()
-        )
-        if existing:
-            await update.message.reply_text("That major already exists for this grade.")
-            return
-        record.name = new_major
-        session.query(Student).filter(
-            Student.grade == grade, Student.major == old_major
-        ).update({Student.major: new_major})
+    error = await run_in_session(
+        handler_context.database, _rename_major, grade, old_major, new_major
+    )
+    if error:
+        await update.message.reply_text(error)
+        return
+    handler_context.rosters.invalidate(grade, old_major)
+    handler_context.rosters.invalidate(grade, new_major)
+    handler_context.report_cache.invalidate()
 
     context.user_data.pop(STATE_EDITING_MAJOR, None)
     await update.message.reply_text(f"Updated major to: {new_major}")
     await _show_major_management(update, context)
 
 
+def _rename_major(session: Session, grade: str, old_major: str, new_major: str) -> Optional[str]:
+    major_id = queries.major_id(session, grade, old_major)
+    record = session.get(Major, major_id) if major_id is not None else None
+    if not record:
+        return "Major not found."
+    existing = (
+        session.query(Major)
+        .filter(Major.grade_id == record.grade_id, Major.name == new_major)
+        .first()
+    )
+    if existing:
+        return "That major already exists for this grade."
+    # Students and the rollup refer to the major by id; nothing else changes.
+    record.name = new_major
+    return None
+
+
 async def _handle_teacher_input(
     update: Update, context: ContextTypes.DEFAULT_TYPE, handler_context: HandlerContext
 ) -> None:
@@ -687,32 +1320,37 @@ async def _handle_teacher_input(
         await _show_management_menu(update, context)
         return
 
-    with session_scope(handler_context.database) as session:
-        existing = session.get(AuthorizedTeacher, teacher_id)
-        if existing:
-            await update.message.reply_text("That teacher ID is already authorized.")
-            context.user_data.pop(STATE_ADDING_TEACHER, None)
-            await _show_management_menu(update, context)
-            return
-        session.add(AuthorizedTeacher(telegram_id=teacher_id))
+    added = await run_in_session(handler_context.database, _insert_teacher, teacher_id)
+    if not added:
+        await update.message.reply_text("That teacher ID is already authorized.")
+        context.user_data.pop(STATE_ADDING_TEACHER, None)
+        await _show_management_menu(update, context)
+        return
+    handler_context.authorization.add(teacher_id)
 
     context.user_data.pop(STATE_ADDING_TEACHER, None)
     await update.message.reply_text(f"Added teacher ID: {teacher_id}")
     await _show_management_menu(update, context)
 
 
+def _insert_teacher(session: Session, teacher_id: int) -> bool:
+    if session.get(AuthorizedTeacher, teacher_id):
+        return False
+    session.add(AuthorizedTeacher(telegram_id=teacher_id))
+    return True
+
+
 async def _show_grade_management(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     handler_context: HandlerContext = context.bot_data["handler_context"]
-    with session_scope(handler_context.database) as session:
-        grades = session.query(Grade).order_by(Grade.name.asc()).all()
+    grades = await _fetch_grades(handler_context)
 
     rows = []
     if grades:
         for grade in grades:
             rows.append(
                 [
-                    simple_button(f"✏️ {grade.name}", f"grade:edit:{grade.name}"),
-                    simple_button(f"🗑️ {grade.name}", f"grade:delete:{grade.name}"),
+                    simple_button(f"✏️ {grade}", _callback_data("grade:edit:", grade)),
+                    simple_button(f"🗑️ {grade}", _callback_data("grade:delete:", grade)),
                 ]
             )
     rows.append([simple_button("➕ Add Grade", "grade:add")])
@@ -720,7 +1358,7 @@ async def _show_grade_management(update: Update, context: ContextTypes.DEFAULT_T
     keyboard = build_menu(rows)
     message = "Manage grades:"
     if update.callback_query:
-        await update.callback_query.edit_message_text(message, reply_markup=keyboard)
+        await _edit_view(update, context, message, reply_markup=keyboard)
     else:
         await update.message.reply_text(message, reply_markup=keyboard)
 
@@ -728,7 +1366,9 @@ async def _show_grade_management(update: Update, context: ContextTypes.DEFAULT_T
 async def _start_add_grade(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     context.user_data[STATE_ADDING_GRADE] = True
     keyboard = build_menu([[simple_button("⬅️ Cancel", "menu:data")]])
-    await update.callback_query.edit_message_text(
+    await _edit_view(
+        update,
+        context,
         "Send the new grade name (e.g., 10th).",
         reply_markup=keyboard,
     )
@@ -742,22 +1382,29 @@ async def _handle_grade_input(
         await update.message.reply_text("Please send a valid grade name.")
         return
 
-    with session_scope(handler_context.database) as session:
-        existing = session.query(Grade).filter(Grade.name == grade).first()
-        if existing:
-            await update.message.reply_text("That grade already exists.")
-            return
-        session.add(Grade(name=grade))
+    added = await run_in_session(handler_context.database, _insert_grade, grade)
+    if not added:
+        await update.message.reply_text("That grade already exists.")
+        return
 
     context.user_data.pop(STATE_ADDING_GRADE, None)
     await update.message.reply_text(f"Added grade: {grade}")
     await _show_grade_management(update, context)
 
 
+def _insert_grade(session: Session, grade: str) -> bool:
+    if session.query(Grade).filter(Grade.name == grade).first():
+        return False
+    session.add(Grade(name=grade))
+    return True
+
+
 async def _start_edit_grade(update: Update, context: ContextTypes.DEFAULT_TYPE, grade: str) -> None:
     context.user_data[STATE_EDITING_GRADE] = grade
     keyboard = build_menu([[simple_button("⬅️ Cancel", "menu:data")]])
-    await update.callback_query.edit_message_text(
+    await _edit_view(
+        update,
+        context,
         f"Send the new name for grade: {grade}",
         reply_markup=keyboard,
     )
@@ -776,86 +1423,108 @@ async def _handle_grade_edit(
         await update.message.reply_text("Please send a valid grade name.")
         return
 
-    with session_scope(handler_context.database) as session:
-        record = session.query(Grade).filter(Grade.name == old_grade).first()
-        if not record:
-            await update.message.reply_text("Grade not found.")
-            return
-        existing = session.query(Grade).filter(Grade.name == new_grade).first()
-        if existing:
-            await update.message.reply_text("That grade already exists.")
-            return
-        record.name = new_grade
-        session.query(Major).filter(Major.grade == old_grade).update({Major.grade: new_grade})
-        session.query(Student).filter(Student.grade == old_grade).update({Student.grade: new_grade})
+    error = await run_in_session(handler_context.database, _rename_grade, old_grade, new_grade)
+    if error:
+        await update.message.reply_text(error)
+        return
+    handler_context.rosters.invalidate(old_grade)
+    handler_context.rosters.invalidate(new_grade)
+    handler_context.report_cache.invalidate()
 
     context.user_data.pop(STATE_EDITING_GRADE, None)
     await update.message.reply_text(f"Updated grade to: {new_grade}")
     await _show_grade_management(update, context)
 
 
+def _rename_grade(session: Session, old_grade: str, new_grade: str) -> Optional[str]:
+    record = session.query(Grade).filter(Grade.name == old_grade).first()
+    if not record:
+        return "Grade not found."
+    existing = session.query(Grade).filter(Grade.name == new_grade).first()
+    if existing:
+        return "That grade already exists."
+    # Majors refer to the grade by id; nothing else changes.
+    record.name = new_grade
+    return None
+
+
 async def _delete_grade(update: Update, context: ContextTypes.DEFAULT_TYPE, grade: str) -> None:
     handler_context: HandlerContext = context.bot_data["handler_context"]
-    with session_scope(handler_context.database) as session:
-        record = session.query(Grade).filter(Grade.name == grade).first()
-        if not record:
-            await update.callback_query.edit_message_text("Grade not found.")
-            return
-        has_students = session.query(Student).filter(Student.grade == grade).first()
-        has_majors = session.query(Major).filter(Major.grade == grade).first()
-        if has_students or has_majors:
-            await update.callback_query.edit_message_text(
-                "Cannot delete a grade with students or majors assigned.",
-                reply_markup=build_menu([[simple_button("⬅️ Back", "menu:data")]]),
-            )
-            return
-        session.delete(record)
+    outcome = await run_in_session(handler_context.database, _remove_grade, grade)
+    if outcome == DELETE_NOT_FOUND:
+        await _edit_view(update, context, "Grade not found.")
+        return
+    if outcome == DELETE_IN_USE:
+        await _edit_view(
+            update,
+            context,
+            "Cannot delete a grade with students or majors assigned.",
+            reply_markup=build_menu([[simple_button("⬅️ Back", "menu:data")]]),
+        )
+        return
 
     await _show_grade_management(update, context)
 
 
+def _remove_grade(session: Session, grade: str) -> str:
+    record = session.query(Grade).filter(Grade.name == grade).first()
+    if not record:
+        return DELETE_NOT_FOUND
+    # Every student belongs to a major, so a grade without majors has no students.
+    if session.query(Major).filter(Major.grade_id == record.id).first():
+        return DELETE_IN_USE
+    session.delete(record)
+    return DELETE_DONE
+
+
 async def _delete_major(update: Update, context: ContextTypes.DEFAULT_TYPE, major: str) -> None:
     handler_context: HandlerContext = context.bot_data["handler_context"]
     grade = context.user_data.get(STATE_GRADE)
     if not grade:
-        await update.callback_query.edit_message_text("Please select a grade first.")
+        await _edit_view(update, context, "Please select a grade first.")
         return
 
-    with session_scope(handler_context.database) as session:
-        record = (
-            session.query(Major)
-            .filter(Major.grade == grade, Major.name == major)
-            .first()
-        )
-        if not record:
-            await update.callback_query.edit_message_text("Major not found.")
-            return
-
-        student_exists = (
-            session.query(Student)
-            .filter(Student.grade == grade, Student.major == major)
-            .first()
+    outcome = await run_in_session(handler_context.database, _remove_major, grade, major)
+    if outcome == DELETE_NOT_FOUND:
+        await _edit_view(update, context, "Major not found.")
+        return
+    if outcome == DELETE_IN_USE:
+        await _edit_view(
+            update,
+            context,
+            "Cannot delete a major with students assigned.",
+            reply_markup=build_menu([[simple_button("⬅️ Back", "menu:students")]]),
         )
-        if student_exists:
-            await update.callback_query.edit_message_text(
-                "Cannot delete a major with students assigned.",
-                reply_markup=build_menu([[simple_button("⬅️ Back", "menu:students")]]),
-            )
-            return
-        session.delete(record)
+        return
 
     await _show_major_management(update, context)
 
 
+def _remove_major(session: Session, grade: str, major: str) -> str:
+    major_id = queries.major_id(session, grade, major)
+    record = session.get(Major, major_id) if major_id is not None else None
+    if not record:
+        return DELETE_NOT_FOUND
+
+    student_exists = session.query(Student).filter(Student.major_id == record.id).first()
+    if student_exists:
+        return DELETE_IN_USE
+    session.delete(record)
+    return DELETE_DONE
+
+
 async def _handle_major_selection(
     update: Update, context: ContextTypes.DEFAULT_TYPE, major: str
 ) -> None:
     context.user_data[STATE_MAJOR] = major
     context.user_data[STATE_PAGE] = 0
+    context.user_data.pop(STATE_PAGE_CURSORS, None)
 
     if context.user_data.get(STATE_ADDING_STUDENTS):
         keyboard = build_menu([[simple_button("⬅️ Cancel", "menu:main")]])
-        await update.callback_query.edit_message_text(
+        await _edit_view(
+            update,
+            context,
             "Send student entries in this format:\n"
             "`STUDENT_ID,Full Name`\n"
             "One student per line. Example:\n"
@@ -873,6 +1542,19 @@ async def _handle_major_selection(
         await _show_student_management_list(update, context)
         return
 
+    report = context.user_data.get(STATE_REPORT)
+    if report == REPORT_CSV:
+        await _send_absences_csv(update, context, context.user_data.get(STATE_GRADE), major)
+        return
+    if report == REPORT_CLASS_DAY:
+        await _show_class_day_report(
+            update, context, _today(context.bot_data["handler_context"])
+        )
+        return
+    if report == REPORT_STUDENT_HISTORY:
+        await _show_report_student_list(update, context)
+        return
+
     await _show_student_list(update, context)
 
 
@@ -887,6 +1569,10 @@ async def _handle_page(update: Update, context: ContextTypes.DEFAULT_TYPE, page:
         await _show_student_management_list(update, context)
         return
 
+    if context.user_data.get(STATE_REPORT) == REPORT_STUDENT_HISTORY:
+        await _show_report_student_list(update, context)
+        return
+
     await _show_student_list(update, context)
 
 
@@ -925,36 +1611,31 @@ async def _handle_student_input(
         )
         return
 
-    added = 0
     skipped = 0
     # Dedupe in-memory to avoid batch duplicates rolling back the transaction.
     seen_ids: set[str] = set()
-    seen_name_keys: set[tuple[str, str, str]] = set()
+    seen_names: set[str] = set()
     unique_parsed: list[tuple[str, str]] = []
     for student_id, full_name in parsed:
-        name_key = (full_name, grade, major)
-        if student_id in seen_ids or name_key in seen_name_keys:
+        if student_id in seen_ids or full_name in seen_names:
             skipped += 1
             continue
         seen_ids.add(student_id)
-        seen_name_keys.add(name_key)
+        seen_names.add(full_name)
         unique_parsed.append((student_id, full_name))
-    with session_scope(handler_context.database) as session:
-        for student_id, full_name in unique_parsed:
-            existing = session.get(Student, student_id)
-            if existing:
-                skipped += 1
-                continue
-            duplicate = (
-                session.query(Student)
-                .filter(Student.full_name == full_name, Student.grade == grade, Student.major == major)
-                .first()
-            )
-            if duplicate:
-                skipped += 1
-                continue
-            session.add(Student(id=student_id, full_name=full_name, grade=grade, major=major))
-            added += 1
+    result = await run_in_session(
+        handler_context.database, _insert_students, grade, major, unique_parsed
+    )
+    if result is None:
+        # The class was deleted while this prompt was open.
+        context.user_data.clear()
+        await update.message.reply_text("Major not found. No students were added.")
+        await _show_main_menu(update, context)
+        return
+    added, duplicates = result
+    skipped += duplicates
+    if added:
+        handler_context.rosters.invalidate(grade, major)
 
     response = [f"Added {added} student(s)."]
     if skipped:
@@ -967,48 +1648,76 @@ async def _handle_student_input(
     await _show_main_menu(update, context)
 
 
+def _insert_students(
+    session: Session, grade: str, major: str, entries: list[tuple[str, str]]
+) -> Optional[tuple[int, int]]:
+    # Entries are already unique within the batch; check them against the
+    # table with one query per key and write the survivors in one executemany.
+    # Returns the added and duplicate counts, or None when the class is gone.
+    major_id = queries.major_id(session, grade, major)
+    if major_id is None:
+        return None
+    existing_ids = {
+        row.id
+        for row in session.query(Student.id).filter(
+            Student.id.in_([student_id for student_id, _ in entries])
+        )
+    }
+    existing_names = {
+        row.full_name
+        for row in session.query(Student.full_name).filter(
+            Student.major_id == major_id,
+            Student.full_name.in_([full_name for _, full_name in entries]),
+        )
+    }
+    rows = [
+        {"id": student_id, "full_name": full_name, "major_id": major_id}
+        for student_id, full_name in entries
+        if student_id not in existing_ids and full_name not in existing_names
+    ]
+    if rows:
+        session.execute(insert(Student), rows)
+    return len(rows), len(entries) - len(rows)
+
+
 async def _show_student_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     handler_context: HandlerContext = context.bot_data["handler_context"]
     grade = context.user_data.get(STATE_GRADE)
     major = context.user_data.get(STATE_MAJOR)
-    page = context.user_data.get(STATE_PAGE, 0)
 
     if not grade or not major:
         message = "Please select grade and major."
         if update.callback_query:
-            await update.callback_query.edit_message_text(message)
+            await _edit_view(update, context, message)
         else:
             await update.message.reply_text(message)
         return
 
-    with session_scope(handler_context.database) as session:
-        students = (
-            session.query(Student)
-            .filter(Student.grade == grade, Student.major == major)
-            .order_by(Student.full_name.asc())
-            .all()
-        )
+    page, roster_page, page_count = await _load_roster_page(
+        handler_context, context, grade, major
+    )
 
-    if not students:
-        await update.callback_query.edit_message_text(
+    if not roster_page.entries:
+        await _edit_view(
+            update,
+            context,
             "No students found for this class.",
             reply_markup=build_menu([[simple_button("⬅️ Back", "menu:students")]]),
         )
         return
 
-    max_page = max((len(students) - 1) // handler_context.config.page_size, 0)
-    page = min(page, max_page)
-    context.user_data[STATE_PAGE] = page
-
-    items = [InlineKeyboardButton(s.full_name, callback_data="noop") for s in students]
-    keyboard = paginated_buttons(
+    items = [
+        InlineKeyboardButton(s.full_name, callback_data="noop") for s in roster_page.entries
+    ]
+    keyboard = page_buttons(
         items,
         page,
-        handler_context.config.page_size,
+        roster_page.has_next,
         "menu:students",
+        page_count=page_count,
     )
-    await update.callback_query.edit_message_text(
-        f"Students in {grade} - {major}:", reply_markup=keyboard
+    await _edit_view(
+        update, context, f"Students in {grade} - {major}:", reply_markup=keyboard
     )
 
 
@@ -1016,48 +1725,40 @@ async def _show_student_management_list(update: Update, context: ContextTypes.DE
     handler_context: HandlerContext = context.bot_data["handler_context"]
     grade = context.user_data.get(STATE_GRADE)
     major = context.user_data.get(STATE_MAJOR)
-    page = context.user_data.get(STATE_PAGE, 0)
 
     if not grade or not major:
-        await update.callback_query.edit_message_text("Please select grade and major.")
+        await _edit_view(update, context, "Please select grade and major.")
         return
 
-    with session_scope(handler_context.database) as session:
-        students = (
-            session.query(Student)
-            .filter(Student.grade == grade, Student.major == major)
-            .order_by(Student.full_name.asc())
-            .all()
-        )
+    page, roster_page, page_count = await _load_roster_page(
+        handler_context, context, grade, major
+    )
 
-    if not students:
+    if not roster_page.entries:
         message = "No students found for this class."
         keyboard = build_menu([[simple_button("⬅️ Back", "data:students")]])
         if update.callback_query:
-            await update.callback_query.edit_message_text(message, reply_markup=keyboard)
+            await _edit_view(update, context, message, reply_markup=keyboard)
         else:
             await update.message.reply_text(message, reply_markup=keyboard)
         return
 
-    max_page = max((len(students) - 1) // handler_context.config.page_size, 0)
-    page = min(page, max_page)
-    context.user_data[STATE_PAGE] = page
-
     items = [
         InlineKeyboardButton(
-            f"{student.full_name}", callback_data=f"student:manage:{student.id}"
+            f"{student.full_name}", callback_data=_callback_data("student:manage:", student.id)
         )
-        for student in students
+        for student in roster_page.entries
     ]
-    keyboard = paginated_buttons(
+    keyboard = page_buttons(
         items,
         page,
-        handler_context.config.page_size,
+        roster_page.has_next,
         "data:students",
+        page_count=page_count,
     )
     message = f"Manage students in {grade} - {major}:"
     if update.callback_query:
-        await update.callback_query.edit_message_text(message, reply_markup=keyboard)
+        await _edit_view(update, context, message, reply_markup=keyboard)
     else:
         await update.message.reply_text(message, reply_markup=keyboard)
 
@@ -1066,17 +1767,16 @@ async def _show_student_management_actions(
     update: Update, context: ContextTypes.DEFAULT_TYPE, student_id: str
 ) -> None:
     handler_context: HandlerContext = context.bot_data["handler_context"]
-    with session_scope(handler_context.database) as session:
-        student = session.get(Student, student_id)
+    student = await run_in_session(handler_context.database, queries.student, student_id)
 
     if not student:
-        await update.callback_query.edit_message_text("Student not found.")
+        await _edit_view(update, context, "Student not found.")
         return
 
     keyboard = build_menu(
         [
-            [simple_button("✏️ Edit Student", f"student:edit:{student.id}")],
-            [simple_button("🗑️ Delete Student", f"student:delete:{student.id}")],
+            [simple_button("✏️ Edit Student", _callback_data("student:edit:", student.id))],
+            [simple_button("🗑️ Delete Student", _callback_data("student:delete:", student.id))],
             [simple_button("⬅️ Back", "students:manage")],
         ]
     )
@@ -1086,7 +1786,7 @@ async def _show_student_management_actions(
         f"Grade: {student.grade}\n"
         f"Major: {student.major}"
     )
-    await update.callback_query.edit_message_text(message, reply_markup=keyboard)
+    await _edit_view(update, context, message, reply_markup=keyboard)
 
 
 async def _start_edit_student(
@@ -1094,7 +1794,9 @@ async def _start_edit_student(
 ) -> None:
     context.user_data[STATE_EDITING_STUDENT] = student_id
     keyboard = build_menu([[simple_button("⬅️ Cancel", "students:manage")]])
-    await update.callback_query.edit_message_text(
+    await _edit_view(
+        update,
+        context,
         "Send updated student info in this format:\n"
         "`Full Name, Grade, Major`\n"
         "Example:\n"
@@ -1128,124 +1830,178 @@ async def _handle_student_edit(
 
     full_name, grade, major = parts
 
-    with session_scope(handler_context.database) as session:
-        student = session.get(Student, student_id)
-        if not student:
-            await update.message.reply_text("Student not found.")
-            return
-        grade_record = session.query(Grade).filter(Grade.name == grade).first()
-        if not grade_record:
-            await update.message.reply_text("That grade does not exist.")
-            return
-        major_record = (
-            session.query(Major)
-            .filter(Major.grade == grade, Major.name == major)
-            .first()
-        )
-        if not major_record:
-            await update.message.reply_text("That major does not exist for the grade.")
-            return
-        duplicate = (
-            session.query(Student)
-            .filter(
-                Student.id != student_id,
-                Student.full_name == full_name,
-                Student.grade == grade,
-                Student.major == major,
-            )
-            .first()
-        )
-        if duplicate:
-            await update.message.reply_text(
-                "Another student already exists with that name, grade, and major."
-            )
-            return
-        student.full_name = full_name
-        student.grade = grade
-        student.major = major
+    error = await run_in_session(
+        handler_context.database, _update_student, student_id, full_name, grade, major
+    )
+    if error:
+        await update.message.reply_text(error)
+        return
+    # The edit may move the student between classes; the old class is not known here.
+    handler_context.rosters.invalidate()
+    handler_context.report_cache.invalidate()
 
     context.user_data.pop(STATE_EDITING_STUDENT, None)
     await update.message.reply_text("Student updated.")
     await _show_student_management_list(update, context)
 
 
+def _update_student(
+    session: Session, student_id: str, full_name: str, grade: str, major: str
+) -> Optional[str]:
+    student = session.get(Student, student_id)
+    if not student:
+        return "Student not found."
+    grade_record = session.query(Grade).filter(Grade.name == grade).first()
+    if not grade_record:
+        return "That grade does not exist."
+    major_record = (
+        session.query(Major)
+        .filter(Major.grade_id == grade_record.id, Major.name == major)
+        .first()
+    )
+    if not major_record:
+        return "That major does not exist for the grade."
+    duplicate = (
+        session.query(Student)
+        .filter(
+            Student.id != student_id,
+            Student.full_name == full_name,
+            Student.major_id == major_record.id,
+        )
+        .first()
+    )
+    if duplicate:
+        return "Another student already exists with that name, grade, and major."
+    if student.major_id != major_record.id:
+        rollups.move_student(session, student_id, student.major_id, major_record.id)
+    student.full_name = full_name
+    student.major_id = major_record.id
+    return None
+
+
 async def _delete_student(
     update: Update, context: ContextTypes.DEFAULT_TYPE, student_id: str
 ) -> None:
     handler_context: HandlerContext = context.bot_data["handler_context"]
-    with session_scope(handler_context.database) as session:
-        student = session.get(Student, student_id)
-        if not student:
-            await update.callback_query.edit_message_text("Student not found.")
-            return
-        session.query(Absence).filter(Absence.student_id == student_id).delete()
-        session.delete(student)
+    student_class = await run_in_session(handler_context.database, _remove_student, student_id)
+    if not student_class:
+        await _edit_view(update, context, "Student not found.")
+        return
+    handler_context.rosters.invalidate(*student_class)
+    handler_context.report_cache.invalidate()
 
     await _show_student_management_list(update, context)
 
 
+def _remove_student(session: Session, student_id: str) -> Optional[tuple[str, str]]:
+    record = queries.student(session, student_id)
+    if not record:
+        return None
+    student = session.get(Student, student_id)
+    rollups.move_student(session, student_id, student.major_id, None)
+    session.query(Absence).filter(Absence.student_id == student_id).delete()
+    session.delete(student)
+    return record.grade, record.major
+
+
 async def _show_absence_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     handler_context: HandlerContext = context.bot_data["handler_context"]
     grade = context.user_data.get(STATE_GRADE)
     major = context.user_data.get(STATE_MAJOR)
-    page = context.user_data.get(STATE_PAGE, 0)
 
     if not grade or not major:
-        await update.callback_query.edit_message_text("Please select grade and major.")
+        await _edit_view(update, context, "Please select grade and major.")
         return
 
-    with session_scope(handler_context.database) as session:
-        students = (
-            session.query(Student)
-            .filter(Student.grade == grade, Student.major == major)
-            .order_by(Student.full_name.asc())
-            .all()
-        )
+    page, roster_page, page_count = await _load_roster_page(
+        handler_context, context, grade, major
+    )
 
-    if not students:
-        await update.callback_query.edit_message_text(
+    if not roster_page.entries:
+        await _edit_view(
+            update,
+            context,
             "No students found for this class.",
             reply_markup=build_menu([[simple_button("⬅️ Back", "menu:main")]]),
         )
         return
 
-    max_page = max((len(students) - 1) // handler_context.config.page_size, 0)
-    page = min(page, max_page)
-    context.user_data[STATE_PAGE] = page
-
     selected = context.user_data.setdefault(STATE_SELECTED_STUDENTS, set())
-    buttons: List[InlineKeyboardButton] = []
-    for student in students:
-        is_selected = student.id in selected
-        label = f"{'✅' if is_selected else '⬜️'} {student.full_name}"
-        buttons.append(InlineKeyboardButton(label, callback_data=f"absence:toggle:{student.id}"))
+    buttons: List[InlineKeyboardButton] = [
+        InlineKeyboardButton(
+            _absence_label(student.full_name, student.id in selected),
+            callback_data=_callback_data(TOGGLE_ABSENCE_PREFIX, student.id),
+        )
+        for student in roster_page.entries
+    ]
 
     extra_buttons = [
         simple_button("✅ Confirm Absence", "absence:confirm"),
         simple_button("⬅️ Back", "absence:cancel"),
     ]
 
-    keyboard = paginated_buttons(
+    keyboard = page_buttons(
         buttons,
         page,
-        handler_context.config.page_size,
+        roster_page.has_next,
         "menu:main",
         extra_buttons=extra_buttons,
+        page_count=page_count,
     )
-    await update.callback_query.edit_message_text(
-        f"Mark absences for {grade} - {major}:", reply_markup=keyboard
+    await _edit_view(
+        update, context, f"Mark absences for {grade} - {major}:", reply_markup=keyboard
     )
+    message = update.callback_query.message
+    if message is not None:
+        context.user_data[STATE_ABSENCE_VIEW] = (message.chat_id, message.message_id, keyboard)
+
+
+def _absence_label(full_name: str, is_selected: bool) -> str:
+    return f"{'✅' if is_selected else '⬜️'} {full_name}"
 
 
 async def _toggle_absence_student(
     update: Update, context: ContextTypes.DEFAULT_TYPE, student_id: str
 ) -> None:
+    """Flip one student and patch only their button in the last rendered page.
+
+    The page shown in this message is kept in ``STATE_ABSENCE_VIEW``, so a
+    tap needs no roster lookup and sends only the reply markup. The edit
+    goes through the coalescer, so a burst of taps sends the latest
+    keyboard once. Taps on a message that is not the last rendered page
+    re-render it in full.
+    """
     selected: set = context.user_data.setdefault(STATE_SELECTED_STUDENTS, set())
-    if student_id in selected:
-        selected.remove(student_id)
-    else:
+    is_selected = student_id not in selected
+    if is_selected:
         selected.add(student_id)
-    await _show_absence_list(update, context)
+    else:
+        selected.discard(student_id)
+
+    view = context.user_data.get(STATE_ABSENCE_VIEW)
+    message = update.callback_query.message
+    keyboard = None
+    if (
+        view is not None
+        and message is not None
+        and view[:2] == (message.chat_id, message.message_id)
+    ):
+        keyboard = relabel_button(
+            view[2],
+            _callback_data(TOGGLE_ABSENCE_PREFIX, student_id),
+            lambda label: _absence_label(label.split(" ", 1)[1], is_selected),
+        )
+    if keyboard is None:
+        await _show_absence_list(update, context)
+        return
+
+    context.user_data[STATE_ABSENCE_VIEW] = (message.chat_id, message.message_id, keyboard)
+    query = update.callback_query
+    handler_context: HandlerContext = context.bot_data["handler_context"]
+    await handler_context.edits.schedule(
+        (message.chat_id, message.message_id),
+        lambda: handler_context.views.edit_markup(query, keyboard),
+    )
 
 
 async def _confirm_absences(
@@ -1253,7 +2009,9 @@ async def _confirm_absences(
 ) -> None:
     selected: set = context.user_data.get(STATE_SELECTED_STUDENTS, set())
     if not selected:
-        await update.callback_query.edit_message_text(
+        await _edit_view(
+            update,
+            context,
             "No students selected.",
             reply_markup=build_menu([[simple_button("⬅️ Back", "menu:main")]]),
         )
@@ -1264,97 +2022,309 @@ async def _confirm_absences(
     absence_date = now.date()
     created_at = now
 
-    inserted = 0
-    skipped = 0
-
-    with session_scope(handler_context.database) as session:
-        for student_id in selected:
-            exists = (
-                session.query(Absence)
-                .filter(Absence.student_id == student_id, Absence.absence_date == absence_date)
-                .first()
-            )
-            if exists:
-                skipped += 1
-                continue
-            session.add(
-                Absence(
-                    student_id=student_id,
-                    teacher_id=teacher_id,
-                    absence_date=absence_date,
-                    created_at=created_at,
-                )
-            )
-            inserted += 1
+    inserted, skipped = await run_in_session(
+        handler_context.database,
+        _insert_absences,
+        list(selected),
+        teacher_id,
+        absence_date,
+        created_at,
+    )
+    if inserted:
+        handler_context.report_cache.invalidate()
 
     message = f"Recorded {inserted} absence(s)."
     if skipped:
         message += f" Skipped {skipped} duplicate(s) for today."
 
-    await update.callback_query.edit_message_text(message)
+    await _edit_view(update, context, message)
     context.user_data.clear()
     await _show_main_menu(update, context)
 
 
+def _insert_absences(
+    session: Session,
+    student_ids: list[str],
+    teacher_id: int,
+    absence_date: date,
+    created_at: datetime,
+) -> tuple[int, int]:
+    # One statement for the whole selection; uq_absence_student_day turns
+    # same-day duplicates into no-ops, and RETURNING reports only inserted rows.
+    statement = (
+        sqlite_insert(Absence)
+        .values(
+            [
+                {
+                    "student_id": student_id,
+                    "teacher_id": teacher_id,
+                    "absence_date": absence_date,
+                    "created_at": created_at,
+                }
+                for student_id in student_ids
+            ]
+        )
+        .on_conflict_do_nothing(index_elements=["student_id", "absence_date"])
+        .returning(Absence.student_id)
+    )
+    inserted = session.execute(statement).scalars().all()
+    rollups.record_absences(session, absence_date, inserted)
+    return len(inserted), len(student_ids) - len(inserted)
+
+
 def _resolve_database_path(config: BotConfig) -> Path:
     return Path(config.database.sqlite_path).expanduser().resolve()
 
 
-def _create_database_backup(config: BotConfig) -> Path:
-    source_path = _resolve_database_path(config)
-    if not source_path.exists():
-        raise FileNotFoundError(f"Database file not found at {source_path}")
+def _describe_backup_progress(progress: BackupProgress) -> str:
+    if progress.compressing:
+        return "Compressing database export..."
+    return f"Preparing database export... {progress.fraction:.0%}"
 
-    with tempfile.NamedTemporaryFile(prefix="absence_bot_backup_", suffix=".sqlite3", delete=False) as handle:
-        backup_path = Path(handle.name)
 
-    with sqlite3.connect(source_path) as source, sqlite3.connect(backup_path) as dest:
-        source.backup(dest)
+async def _create_database_backup(
+    config: BotConfig, status_message: Optional[Message] = None
+) -> Snapshot:
+    """Take a snapshot in a worker thread, keeping the event loop free.
 
-    return backup_path
+    When ``status_message`` is given it is edited in place with the
+    progress of the copy every few seconds.
+    """
+    progress = BackupProgress()
+    task = asyncio.ensure_future(
+        asyncio.to_thread(create_snapshot, _resolve_database_path(config), progress)
+    )
+    if status_message is None:
+        return await task
+
+    shown = status_message.text
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=BACKUP_PROGRESS_INTERVAL_SECONDS)
+        if done:
+            return task.result()
+        description = _describe_backup_progress(progress)
+        if description == shown:
+            continue
+        try:
+            await status_message.edit_text(description)
+        except TelegramError as exc:
+            LOGGER.debug("Unable to update export progress: %s", exc)
+        shown = description
 
 
-async def _send_database_backup(
+async def _deliver_snapshot(
     context: ContextTypes.DEFAULT_TYPE,
-    handler_context: HandlerContext,
-    user_id: int,
+    snapshot: Snapshot,
+    recipients: Iterable[int],
     caption: str,
-) -> None:
+) -> int:
+    """Upload ``snapshot`` once and send it to every recipient.
+
+    The first successful upload yields a Telegram ``file_id``; the remaining
+    recipients receive that ``file_id`` concurrently instead of another
+    upload. Returns how many recipients received the file.
+    """
+    caption = f"{caption}\n{snapshot.summary()}"
+    pending = list(recipients)
+    file_id: Optional[str] = None
+    while pending and file_id is None:
+        user_id = pending.pop(0)
+        try:
+            with snapshot.path.open("rb") as backup_file:
+                message = await context.bot.send_document(
+                    chat_id=user_id,
+                    document=backup_file,
+                    filename=snapshot.filename,
+                    caption=caption,
+                )
+        except TelegramError as exc:
+            LOGGER.warning("Unable to send database export to %s: %s", user_id, exc)
+            continue
+        file_id = message.document.file_id
+    if file_id is None:
+        return 0
+
+    results = await asyncio.gather(
+        *(
+            context.bot.send_document(chat_id=user_id, document=file_id, caption=caption)
+            for user_id in pending
+        ),
+        return_exceptions=True,
+    )
+    delivered = 1
+    for user_id, result in zip(pending, results):
+        if isinstance(result, Exception):
+            LOGGER.warning("Unable to send database export to %s: %s", user_id, result)
+        else:
+            delivered += 1
+    return delivered
+
+
+async def _send_export(
+    context: ContextTypes.DEFAULT_TYPE,
+    snapshot: Snapshot,
+    recipients: list[int],
+    caption: str,
+) -> bool:
+    """Deliver and delete ``snapshot``; report whether anyone received it."""
     try:
-        backup_path = _create_database_backup(handler_context.config)
-    except FileNotFoundError:
+        delivered = await _deliver_snapshot(context, snapshot, recipients, caption)
+    finally:
+        snapshot.path.unlink(missing_ok=True)
+    LOGGER.info(
+        "Database export %s sent to %d of %d recipient(s)",
+        snapshot.summary(),
+        delivered,
+        len(recipients),
+    )
+    return delivered > 0
+
+
+async def _report_missing_database(
+    context: ContextTypes.DEFAULT_TYPE, recipients: list[int]
+) -> None:
+    for user_id in recipients:
         await context.bot.send_message(
             chat_id=user_id,
             text="Database file not found. Please check the sqlite_path setting.",
         )
-        return
 
+
+async def _send_database_backup(
+    context: ContextTypes.DEFAULT_TYPE,
+    handler_context: HandlerContext,
+    recipients: Iterable[int],
+    caption: str,
+    status_message: Optional[Message] = None,
+) -> Optional[Snapshot]:
+    """Send a full export; returns it if at least one recipient received it."""
+    recipients = list(recipients)
     try:
-        with backup_path.open("rb") as backup_file:
-            await context.bot.send_document(
+        snapshot = await _create_database_backup(handler_context.config, status_message)
+    except FileNotFoundError:
+        await _report_missing_database(context, recipients)
+        return None
+    delivered = await _send_export(context, snapshot, recipients, caption)
+    return snapshot if delivered else None
+
+
+async def _send_database_delta(
+    context: ContextTypes.DEFAULT_TYPE,
+    handler_context: HandlerContext,
+    recipients: list[int],
+    after: int,
+) -> Optional[Snapshot]:
+    try:
+        snapshot = await asyncio.to_thread(
+            create_delta, _resolve_database_path(handler_context.config), after
+        )
+    except FileNotFoundError:
+        await _report_missing_database(context, recipients)
+        return None
+    caption = f"⏰ Incremental database export (changes {after + 1}-{snapshot.sequence})"
+    delivered = await _send_export(context, snapshot, recipients, caption)
+    return snapshot if delivered else None
+
+
+def _query_export_state(session: Session) -> tuple[dict[str, str], int]:
+    """Return the export bookkeeping and the last change_log entry.
+
+    The last entry comes from ``sqlite_sequence``, so it is one row read no
+    matter how much has changed, and unlike ``PRAGMA data_version`` it
+    survives restarts and sees writes made by this process.
+    """
+    state = dict(session.query(ExportState.name, ExportState.value).all())
+    last_change = session.execute(
+        text("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'")
+    ).scalar()
+    return state, last_change or 0
+
+
+async def _send_export_heartbeat(context: ContextTypes.DEFAULT_TYPE, recipients: list[int]) -> None:
+    results = await asyncio.gather(
+        *(
+            context.bot.send_message(
                 chat_id=user_id,
-                document=backup_file,
-                filename=backup_path.name,
-                caption=caption,
+                text="⏰ No database changes since the last export; nothing new to send.",
             )
-    finally:
-        backup_path.unlink(missing_ok=True)
+            for user_id in recipients
+        ),
+        return_exceptions=True,
+    )
+    for user_id, result in zip(recipients, results):
+        if isinstance(result, Exception):
+            LOGGER.warning("Unable to send export heartbeat to %s: %s", user_id, result)
+
+
+def _record_export(session: Session, values: dict[str, str], sequence: int) -> None:
+    for name, value in values.items():
+        session.merge(ExportState(name=name, value=value))
+    # Everything up to ``sequence`` is in the export that was just sent.
+    session.query(ChangeLog).filter(ChangeLog.seq <= sequence).delete()
+
+
+def _discard_change_log(session: Session) -> int:
+    # Nobody receives the deltas, so the chain restarts: once recipients are
+    # configured, the first export is a full one.
+    session.query(ExportState).delete()
+    return session.query(ChangeLog).delete()
 
 
 async def scheduled_database_export(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Send a full export on the full-export cadence and deltas in between.
+
+    Runs with nothing new since the last export are skipped. With no
+    recipients the change log is emptied instead, so it cannot grow
+    without bound.
+    """
     handler_context: HandlerContext = context.bot_data["handler_context"]
-    recipients = handler_context.config.management_user_ids
+    config = handler_context.config
+    recipients = config.management_user_ids
     if not recipients:
-        LOGGER.info("No management users configured for automatic exports.")
+        discarded = await run_in_session(handler_context.database, _discard_change_log)
+        LOGGER.info(
+            "No management users configured for automatic exports; "
+            "discarded %d change log entries.",
+            discarded,
+        )
         return
 
-    for user_id in recipients:
-        await _send_database_backup(
+    state, last_change = await run_in_session(handler_context.database, _query_export_state)
+    watermark = state.get(EXPORT_WATERMARK)
+    if watermark is not None and int(watermark) >= last_change:
+        LOGGER.info("Skipping automatic export: no changes since change %s", watermark)
+        if config.export_heartbeat:
+            await _send_export_heartbeat(context, recipients)
+        return
+
+    now = datetime.now(timezone.utc)
+    last_full = state.get(EXPORT_LAST_FULL_AT)
+    full_due = last_full is None or now - datetime.fromisoformat(last_full) >= timedelta(
+        hours=config.full_export_interval_hours
+    )
+    if full_due:
+        snapshot = await _send_database_backup(
+            context,
+            handler_context,
+            recipients,
+            "⏰ Automated database export (full)",
+        )
+        values = {EXPORT_LAST_FULL_AT: now.isoformat()}
+    else:
+        snapshot = await _send_database_delta(
             context,
             handler_context,
-            user_id,
-            "⏰ Automated database export",
+            recipients,
+            int(watermark or 0),
         )
+        values = {}
+    if snapshot is None:
+        return
+
+    values[EXPORT_WATERMARK] = str(snapshot.sequence)
+    await run_in_session(
+        handler_context.database, _record_export, values, snapshot.sequence
+    )
 
 
 def _is_management(user_id: int, config: BotConfig) -> bool:
@@ -1362,8 +2332,21 @@ def _is_management(user_id: int, config: BotConfig) -> bool:
 
 
 def _is_authorized(user_id: int, handler_context: HandlerContext) -> bool:
-    config = handler_context.config
-    if user_id in config.authorized_teacher_ids or user_id in config.management_user_ids:
-        return True
-    with session_scope(handler_context.database) as session:
-        return session.get(AuthorizedTeacher, user_id) is not None
+    return handler_context.authorization.is_authorized(user_id)
+
+
+async def load_authorization_cache(handler_context: HandlerContext) -> None:
+    teacher_ids = await run_in_session(handler_context.database, queries.teacher_ids)
+    handler_context.authorization.load(teacher_ids)
+
+
+async def scheduled_authorization_refresh(context: ContextTypes.DEFAULT_TYPE) -> None:
+    handler_context: HandlerContext = context.bot_data["handler_context"]
+    await load_authorization_cache(handler_context)
+    cache = handler_context.authorization
+    LOGGER.info(
+        "Authorization cache refreshed: %d user(s), %d hit(s), %d miss(es).",
+        len(cache),
+        cache.hits,
+        cache.misses,
+    )
@@ -1,7 +1,7 @@
 """Inline keyboard builders."""
 from __future__ import annotations
 
-from typing import Iterable, Sequence
+from typing import Callable, Iterable, Optional, Sequence
 
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 
@@ -14,22 +14,23 @@ def simple_button(label: str, callback_data: str) -> InlineKeyboardButton:
     return InlineKeyboardButton(text=label, callback_data=callback_data)
 
 
-def paginated_buttons(
-    items: Sequence[InlineKeyboardButton],
+def page_buttons(
+    page_items: Sequence[InlineKeyboardButton],
     page: int,
-    page_size: int,
+    has_next: bool,
     back_callback: str,
     extra_buttons: Iterable[InlineKeyboardButton] | None = None,
+    page_count: int | None = None,
 ) -> InlineKeyboardMarkup:
-    start = page * page_size
-    end = start + page_size
-    page_items = items[start:end]
+    """Build a keyboard for one already-fetched page of items."""
     rows = [[item] for item in page_items]
 
     nav_row = []
-    if start > 0:
+    if page > 0:
         nav_row.append(simple_button("⬅️ Prev", f"page:{page - 1}"))
-    if end < len(items):
+    if page_count and page_count > 1:
+        nav_row.append(simple_button(f"{page + 1}/{page_count}", "noop"))
+    if has_next:
         nav_row.append(simple_button("Next ➡️", f"page:{page + 1}"))
     if nav_row:
         rows.append(nav_row)
@@ -39,3 +40,23 @@ def paginated_buttons(
 
     rows.append([simple_button("⬅️ Back", back_callback)])
     return build_menu(rows)
+
+
+def relabel_button(
+    markup: InlineKeyboardMarkup, callback_data: str, relabel: Callable[[str], str]
+) -> Optional[InlineKeyboardMarkup]:
+    """Copy ``markup`` with the button for ``callback_data`` relabelled.
+
+    Every other button is reused as is. Returns ``None`` when no button
+    carries ``callback_data``.
+    """
+    for row_index, row in enumerate(markup.inline_keyboard):
+        for column, button in enumerate(row):
+            if button.callback_data != callback_data:
+                continue
+            rows = [list(existing) for existing in markup.inline_keyboard]
+            rows[row_index][column] = InlineKeyboardButton(
+                relabel(button.text), callback_data=callback_data
+            )
+            return build_menu(rows)
+    return None
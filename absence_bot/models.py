@@ -3,7 +3,17 @@ from __future__ import annotations
 
 from datetime import date, datetime
 
-from sqlalchemy import Date, DateTime, Integer, String, UniqueConstraint
+from sqlalchemy import (
+    DDL,
+    Date,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    UniqueConstraint,
+    event,
+)
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
 
@@ -16,11 +26,11 @@ class Student(Base):
 
     id: Mapped[str] = mapped_column(String(32), primary_key=True)
     full_name: Mapped[str] = mapped_column(String(200), nullable=False)
-    grade: Mapped[str] = mapped_column(String(20), nullable=False)
-    major: Mapped[str] = mapped_column(String(100), nullable=False)
+    major_id: Mapped[int] = mapped_column(Integer, ForeignKey("majors.id"), nullable=False)
 
     __table_args__ = (
-        UniqueConstraint("full_name", "grade", "major", name="uq_student_name_grade_major"),
+        UniqueConstraint("major_id", "full_name", name="uq_student_class_name"),
+        Index("ix_students_class_name", "major_id", "full_name", "id"),
     )
 
 
@@ -28,11 +38,11 @@ class Major(Base):
     __tablename__ = "majors"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    grade: Mapped[str] = mapped_column(String(20), nullable=False)
+    grade_id: Mapped[int] = mapped_column(Integer, ForeignKey("grades.id"), nullable=False)
     name: Mapped[str] = mapped_column(String(100), nullable=False)
 
     __table_args__ = (
-        UniqueConstraint("grade", "name", name="uq_major_grade_name"),
+        UniqueConstraint("grade_id", "name", name="uq_major_grade_name"),
     )
 
 
@@ -54,6 +64,8 @@ class Absence(Base):
 
     __table_args__ = (
         UniqueConstraint("student_id", "absence_date", name="uq_absence_student_day"),
+        Index("ix_absences_date_student", "absence_date", "student_id"),
+        Index("ix_absences_teacher_date", "teacher_id", "absence_date"),
     )
 
 
@@ -61,3 +73,102 @@ class AuthorizedTeacher(Base):
     __tablename__ = "authorized_teachers"
 
     telegram_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+
+
+class DailyClassAbsence(Base):
+    """Absences per class (major) per day, kept in step with ``absences``.
+
+    Counts follow each student's current class, matching a join of
+    ``absences`` with ``students``.
+    """
+
+    __tablename__ = "daily_class_absence"
+
+    absence_date: Mapped[date] = mapped_column(Date, primary_key=True)
+    major_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    absences: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("ix_daily_class_absence_class", "major_id", "absence_date"),
+    )
+
+
+class ChangeLog(Base):
+    """Keys of rows written since the last export, recorded by triggers."""
+
+    __tablename__ = "change_log"
+
+    seq: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    table_name: Mapped[str] = mapped_column(String(50), nullable=False)
+    row_key: Mapped[str] = mapped_column(String(32), nullable=False)
+
+    __table_args__ = ({"sqlite_autoincrement": True},)
+
+
+class ExportState(Base):
+    __tablename__ = "export_state"
+
+    name: Mapped[str] = mapped_column(String(50), primary_key=True)
+    value: Mapped[str] = mapped_column(String(100), nullable=False)
+
+
+class CatalogVersion(Base):
+    """A single row counting writes to ``grades`` and ``majors``.
+
+    Bumped by triggers, so every process sharing the database can tell
+    whether its cached grade and major lists are still current.
+    """
+
+    __tablename__ = "catalog_version"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, nullable=False)
+
+
+# Tables whose writes are recorded in change_log, with their primary key, in
+# the order rows must be inserted when restoring.
+CHANGE_TRACKED_TABLES: tuple[tuple[str, str], ...] = (
+    ("grades", "id"),
+    ("majors", "id"),
+    ("students", "id"),
+    ("absences", "id"),
+    ("authorized_teachers", "telegram_id"),
+)
+
+
+def change_log_triggers(table: str, key: str) -> list[str]:
+    log = "INSERT INTO change_log (table_name, row_key)"
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS trg_{table}_insert_log AFTER INSERT ON {table} "
+        f"BEGIN {log} VALUES ('{table}', NEW.{key}); END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_{table}_update_log AFTER UPDATE ON {table} "
+        f"BEGIN {log} VALUES ('{table}', NEW.{key}); "
+        f"{log} SELECT '{table}', OLD.{key} WHERE OLD.{key} IS NOT NEW.{key}; END",
+        f"CREATE TRIGGER IF NOT EXISTS trg_{table}_delete_log AFTER DELETE ON {table} "
+        f"BEGIN {log} VALUES ('{table}', OLD.{key}); END",
+    ]
+
+
+CATALOG_TABLES = ("grades", "majors")
+
+
+def catalog_version_triggers(table: str) -> list[str]:
+    bump = "UPDATE catalog_version SET version = version + 1"
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS trg_{table}_{event_name.lower()}_catalog "
+        f"AFTER {event_name} ON {table} BEGIN {bump}; END"
+        for event_name in ("INSERT", "UPDATE", "DELETE")
+    ]
+
+
+for _table, _key in CHANGE_TRACKED_TABLES:
+    for _statement in change_log_triggers(_table, _key):
+        event.listen(Base.metadata, "after_create", DDL(_statement))
+event.listen(
+    Base.metadata,
+    "after_create",
+    DDL("INSERT OR IGNORE INTO catalog_version (id, version) VALUES (1, 0)"),
+)
+for _table in CATALOG_TABLES:
+    for _statement in catalog_version_triggers(_table):
+        event.listen(Base.metadata, "after_create", DDL(_statement))
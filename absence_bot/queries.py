@@ -0,0 +1,114 @@
+"""Read-only queries behind the bot's list and detail screens.
+
+Statements are built with :func:`sqlalchemy.lambda_stmt`: each one is
+constructed and compiled once, and later calls only bind new parameters.
+Rows come back as tuples and named tuples rather than ORM instances, so
+nothing is added to the session's identity map.
+"""
+from __future__ import annotations
+
+from typing import NamedTuple, Optional
+
+from sqlalchemy import ScalarSelect, func, lambda_stmt, select, tuple_
+from sqlalchemy.orm import Session
+
+from absence_bot.cache import RosterEntry, RosterPage
+from absence_bot.models import AuthorizedTeacher, CatalogVersion, Grade, Major, Student
+
+
+class StudentRecord(NamedTuple):
+    id: str
+    full_name: str
+    grade: str
+    major: str
+
+
+def class_id(grade: str, major: str) -> ScalarSelect:
+    """The ``majors.id`` of a class named by its grade and major, as a subquery."""
+    return (
+        select(Major.id)
+        .join(Grade, Grade.id == Major.grade_id)
+        .where(Grade.name == grade, Major.name == major)
+        .scalar_subquery()
+    )
+
+
+def major_id(session: Session, grade: str, major: str) -> Optional[int]:
+    return session.execute(lambda_stmt(lambda: select(class_id(grade, major)))).scalar()
+
+
+def roster_page(
+    session: Session,
+    grade: str,
+    major: str,
+    after: Optional[tuple[str, str]],
+    limit: int,
+) -> RosterPage:
+    """One page of a class by ``(full_name, id)``, starting after ``after``."""
+    statement = lambda_stmt(
+        lambda: select(Student.id, Student.full_name).where(
+            Student.major_id == class_id(grade, major)
+        )
+    )
+    if after is not None:
+        after_name, after_id = after
+        statement += lambda s: s.where(
+            tuple_(Student.full_name, Student.id) > tuple_(after_name, after_id)
+        )
+    fetch = limit + 1
+    statement += lambda s: s.order_by(Student.full_name, Student.id).limit(fetch)
+    rows = session.execute(statement).all()
+    entries = tuple(RosterEntry(student_id, name) for student_id, name in rows[:limit])
+    return RosterPage(entries=entries, has_next=len(rows) > limit)
+
+
+def roster_size(session: Session, grade: str, major: str) -> int:
+    return session.execute(
+        lambda_stmt(
+            lambda: select(func.count(Student.id)).where(
+                Student.major_id == class_id(grade, major)
+            )
+        )
+    ).scalar_one()
+
+
+def student(session: Session, student_id: str) -> Optional[StudentRecord]:
+    row = session.execute(
+        lambda_stmt(
+            lambda: select(Student.id, Student.full_name, Grade.name, Major.name)
+            .join(Major, Major.id == Student.major_id)
+            .join(Grade, Grade.id == Major.grade_id)
+            .where(Student.id == student_id)
+        )
+    ).first()
+    return StudentRecord(*row) if row is not None else None
+
+
+def catalog_version(session: Session) -> int:
+    return session.execute(lambda_stmt(lambda: select(CatalogVersion.version))).scalar() or 0
+
+
+def grade_names(session: Session) -> tuple[str, ...]:
+    return tuple(
+        session.execute(lambda_stmt(lambda: select(Grade.name).order_by(Grade.name))).scalars()
+    )
+
+
+def majors_by_grade(session: Session) -> dict[str, tuple[str, ...]]:
+    majors: dict[str, list[str]] = {}
+    rows = session.execute(
+        lambda_stmt(
+            lambda: select(Grade.name, Major.name)
+            .join(Grade, Grade.id == Major.grade_id)
+            .order_by(Grade.name, Major.name)
+        )
+    )
+    for grade, name in rows:
+        majors.setdefault(grade, []).append(name)
+    return {grade: tuple(names) for grade, names in majors.items()}
+
+
+def teacher_ids(session: Session) -> list[int]:
+    return list(
+        session.execute(lambda_stmt(lambda: select(AuthorizedTeacher.telegram_id))).scalars()
+    )
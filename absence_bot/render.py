@@ -0,0 +1,211 @@
+"""Telegram message edits: skipping no-op edits and coalescing bursts."""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional
+
+from telegram import CallbackQuery, InlineKeyboardMarkup
+from telegram.error import BadRequest, TelegramError
+
+LOGGER = logging.getLogger(__name__)
+
+MessageKey = tuple[int, int]
+SendEdit = Callable[[], Awaitable[Any]]
+
+MAX_RENDERED_VIEWS = 4096
+
+
+def _digest(value: Any) -> bytes:
+    encoded = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str).encode()
+    return hashlib.blake2b(encoded, digest_size=16).digest()
+
+
+def _markup_digest(markup: Optional[InlineKeyboardMarkup]) -> bytes:
+    return _digest(markup.to_dict() if markup is not None else None)
+
+
+def _is_not_modified(exc: BadRequest) -> bool:
+    return "message is not modified" in exc.message.lower()
+
+
+class RenderedViews:
+    """Remember what each message shows and skip edits that change nothing.
+
+    Keeps a hash of the text and of the keyboard of the last
+    ``max_views`` messages edited through it. An edit whose hashes match
+    the message is dropped without an API call; ``skipped`` counts those
+    and ``sent`` the calls made. When Telegram still answers "message is
+    not modified", because the message was last set some other way, the
+    error is swallowed and counted in ``not_modified``.
+    """
+
+    def __init__(self, max_views: int = MAX_RENDERED_VIEWS) -> None:
+        self.max_views = max_views
+        self._views: OrderedDict[MessageKey, tuple[bytes, bytes]] = OrderedDict()
+        self.sent = 0
+        self.skipped = 0
+        self.not_modified = 0
+
+    def __len__(self) -> int:
+        return len(self._views)
+
+    async def edit_text(
+        self,
+        query: CallbackQuery,
+        text: str,
+        reply_markup: Optional[InlineKeyboardMarkup] = None,
+        **kwargs: Any,
+    ) -> Any:
+        """``query.edit_message_text`` unless the message already shows this."""
+        view = (_digest([text, kwargs]), _markup_digest(reply_markup))
+        key = self._key(query)
+        if key is not None and self._views.get(key) == view:
+            self._touch(key, view)
+            self.skipped += 1
+            return query.message
+        return await self._send(
+            key, view, lambda: query.edit_message_text(text, reply_markup=reply_markup, **kwargs)
+        )
+
+    async def edit_markup(
+        self, query: CallbackQuery, reply_markup: Optional[InlineKeyboardMarkup]
+    ) -> Any:
+        """``query.edit_message_reply_markup`` unless the keyboard is unchanged."""
+        key = self._key(query)
+        current = self._views.get(key) if key is not None else None
+        markup = _markup_digest(reply_markup)
+        if current is not None and current[1] == markup:
+            self._touch(key, current)
+            self.skipped += 1
+            return query.message
+        view = (current[0], markup) if current is not None else None
+        return await self._send(
+            key, view, lambda: query.edit_message_reply_markup(reply_markup=reply_markup)
+        )
+
+    def forget(self, key: Optional[MessageKey]) -> None:
+        """Drop what is known about a message edited outside this class."""
+        if key is not None:
+            self._views.pop(key, None)
+
+    def log_stats(self) -> None:
+        LOGGER.info(
+            "Message edits: %d sent, %d skipped as unchanged, %d rejected as unchanged",
+            self.sent,
+            self.skipped,
+            self.not_modified,
+        )
+
+    @staticmethod
+    def _key(query: CallbackQuery) -> Optional[MessageKey]:
+        message = query.message
+        return (message.chat_id, message.message_id) if message is not None else None
+
+    def _touch(self, key: MessageKey, view: tuple[bytes, bytes]) -> None:
+        self._views[key] = view
+        self._views.move_to_end(key)
+        while len(self._views) > self.max_views:
+            self._views.popitem(last=False)
+
+    async def _send(
+        self,
+        key: Optional[MessageKey],
+        view: Optional[tuple[bytes, bytes]],
+        send: SendEdit,
+    ) -> Any:
+        self.sent += 1
+        try:
+            result = await send()
+        except BadRequest as exc:
+            if not _is_not_modified(exc):
+                self.forget(key)
+                raise
+            self.not_modified += 1
+            result = None
+        except Exception:
+            # The message may or may not have changed.
+            self.forget(key)
+            raise
+        if view is None:
+            self.forget(key)
+        elif key is not None:
+            self._touch(key, view)
+        return result
+
+
+class EditCoalescer:
+    """Send only the latest of a burst of edits to the same message.
+
+    :meth:`schedule` replaces any edit still waiting for the message; the
+    waiting edit goes out ``delay_seconds`` after the first one of the
+    burst, so a run of taps costs one API call per window instead of one
+    per tap. :meth:`flush` sends a waiting edit straight away, after any
+    edit of the same message already on its way has landed. With a zero
+    delay every edit is sent immediately. ``scheduled`` and ``sent`` count
+    the edits requested and the API calls made.
+    """
+
+    def __init__(self, delay_seconds: float) -> None:
+        self.delay_seconds = delay_seconds
+        self._pending: dict[MessageKey, SendEdit] = {}
+        self._timers: dict[MessageKey, asyncio.Task] = {}
+        self._sending: set[MessageKey] = set()
+        self.scheduled = 0
+        self.sent = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def log_stats(self) -> None:
+        LOGGER.info("Coalesced edits: %d requested, %d sent", self.scheduled, self.sent)
+
+    async def schedule(self, key: MessageKey, send: SendEdit) -> None:
+        self.scheduled += 1
+        if self.delay_seconds <= 0:
+            await self._send(send)
+            return
+        self._pending[key] = send
+        if key not in self._timers:
+            self._timers[key] = asyncio.create_task(self._send_later(key))
+
+    async def flush(self, key: MessageKey) -> None:
+        send = self._pending.pop(key, None)
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            if key in self._sending:
+                # An older edit is in flight; let it land before anything
+                # newer, or it could overwrite the newer screen.
+                await timer
+            else:
+                timer.cancel()
+        if send is not None:
+            await self._send(send)
+
+    async def _send_later(self, key: MessageKey) -> None:
+        try:
+            await asyncio.sleep(self.delay_seconds)
+            send = self._pending.pop(key, None)
+            if send is None:
+                return
+            self._sending.add(key)
+            try:
+                await self._send(send)
+            finally:
+                self._sending.discard(key)
+        finally:
+            if self._timers.get(key) is asyncio.current_task():
+                del self._timers[key]
+            # Edits scheduled while this one was sending start a new window.
+            if key in self._pending and key not in self._timers:
+                self._timers[key] = asyncio.create_task(self._send_later(key))
+
+    async def _send(self, send: SendEdit) -> None:
+        self.sent += 1
+        try:
+            await send()
+        except TelegramError as exc:
+            LOGGER.warning("Deferred message edit failed: %s", exc)
@@ -0,0 +1,158 @@
+"""Read-only absence reports and CSV exports for management.
+
+Each report is one indexed query and returns immutable rows, so results
+can be cached and shared between users until the next absence write.
+"""
+from __future__ import annotations
+
+import csv
+import gzip
+import tempfile
+from datetime import date
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from absence_bot.models import Absence, Grade, Major, Student
+from absence_bot.queries import class_id
+
+TOP_ABSENTEES_LIMIT = 10
+HISTORY_LIMIT = 30
+CSV_CHUNK_ROWS = 5000
+CSV_COLUMNS = (
+    "absence_date",
+    "student_id",
+    "full_name",
+    "grade",
+    "major",
+    "teacher_id",
+    "recorded_at",
+)
+
+
+class Absentee(NamedTuple):
+    student_id: str
+    full_name: str
+    grade: str
+    major: str
+    absences: int
+
+
+class StudentHistory(NamedTuple):
+    full_name: str
+    grade: str
+    major: str
+    total: int
+    recent: tuple[date, ...]
+
+
+def class_on_date(session: Session, grade: str, major: str, day: date) -> tuple[str, ...]:
+    """Names of the students in a class marked absent on ``day``."""
+    rows = session.execute(
+        select(Student.full_name)
+        .join(Absence, Absence.student_id == Student.id)
+        .where(Absence.absence_date == day, Student.major_id == class_id(grade, major))
+        .order_by(Student.full_name)
+    )
+    return tuple(rows.scalars())
+
+
+def top_absentees(
+    session: Session, start: date, end: date, limit: int = TOP_ABSENTEES_LIMIT
+) -> tuple[Absentee, ...]:
+    """Students with the most absences between ``start`` and ``end`` inclusive."""
+    total = func.count(Absence.id).label("absences")
+    rows = session.execute(
+        select(Student.id, Student.full_name, Grade.name, Major.name, total)
+        .join(Student, Student.id == Absence.student_id)
+        .join(Major, Major.id == Student.major_id)
+        .join(Grade, Grade.id == Major.grade_id)
+        .where(Absence.absence_date.between(start, end))
+        .group_by(Absence.student_id)
+        .order_by(total.desc(), Student.full_name)
+        .limit(limit)
+    )
+    return tuple(Absentee(*row) for row in rows)
+
+
+def student_history(
+    session: Session, student_id: str, limit: int = HISTORY_LIMIT
+) -> Optional[StudentHistory]:
+    """A student's total absences and the ``limit`` most recent dates."""
+    total = func.count(Absence.id).over().label("total")
+    rows = session.execute(
+        select(Student.full_name, Grade.name, Major.name, Absence.absence_date, total)
+        .join(Major, Major.id == Student.major_id)
+        .join(Grade, Grade.id == Major.grade_id)
+        .outerjoin(Absence, Absence.student_id == Student.id)
+        .where(Student.id == student_id)
+        .order_by(Absence.absence_date.desc())
+        .limit(limit)
+    ).all()
+    if not rows:
+        return None
+    full_name, grade, major, _, count = rows[0]
+    return StudentHistory(
+        full_name=full_name,
+        grade=grade,
+        major=major,
+        total=count,
+        recent=tuple(row.absence_date for row in rows if row.absence_date is not None),
+    )
+
+
+def write_absences_csv(
+    session: Session,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    grade: Optional[str] = None,
+    major: Optional[str] = None,
+) -> tuple[Path, int]:
+    """Stream matching absences into a temporary gzip-compressed CSV file.
+
+    Rows are fetched ``CSV_CHUNK_ROWS`` at a time and written as they
+    arrive, so memory use does not grow with the size of the export.
+    Returns the file and the number of rows written; the caller deletes
+    the file.
+    """
+    statement = select(
+        Absence.absence_date,
+        Absence.student_id,
+        Student.full_name,
+        Grade.name,
+        Major.name,
+        Absence.teacher_id,
+        Absence.created_at,
+    ).join(Student, Student.id == Absence.student_id).join(
+        Major, Major.id == Student.major_id
+    ).join(Grade, Grade.id == Major.grade_id)
+    if start is not None:
+        statement = statement.where(Absence.absence_date >= start)
+    if end is not None:
+        statement = statement.where(Absence.absence_date <= end)
+    if grade is not None:
+        statement = statement.where(Grade.name == grade)
+    if major is not None:
+        statement = statement.where(Major.name == major)
+    statement = statement.order_by(Absence.absence_date, Absence.student_id).execution_options(
+        yield_per=CSV_CHUNK_ROWS
+    )
+
+    rows = 0
+    with tempfile.NamedTemporaryFile(
+        prefix="absence_bot_absences_", suffix=".csv.gz", delete=False
+    ) as handle:
+        path = Path(handle.name)
+        try:
+            with gzip.open(handle, "wt", encoding="utf-8", newline="") as output:
+                writer = csv.writer(output)
+                writer.writerow(CSV_COLUMNS)
+                for partition in session.execute(statement).partitions():
+                    writer.writerows(partition)
+                    rows += len(partition)
+        except BaseException:
+            path.unlink(missing_ok=True)
+            raise
+    return path, rows
@@ -0,0 +1,97 @@
+"""Per-class daily absence counts maintained alongside the absences table.
+
+Every helper takes the session of the write it accompanies, so the counts
+change in the same transaction as the rows they summarise. Classes are
+keyed by ``majors.id``, so renaming a grade or major leaves the counts
+untouched.
+"""
+from __future__ import annotations
+
+from datetime import date
+from typing import Iterable, Optional
+
+from sqlalchemy import func, literal, select, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from absence_bot.models import DailyClassAbsence, Grade, Major, Student
+
+REBUILD_SQL: tuple[str, ...] = (
+    "DELETE FROM daily_class_absence",
+    "INSERT INTO daily_class_absence (absence_date, major_id, absences) "
+    "SELECT a.absence_date, s.major_id, count(*) "
+    "FROM absences a JOIN students s ON s.id = a.student_id "
+    "GROUP BY a.absence_date, s.major_id",
+)
+
+_ADD_STUDENT_DAYS = text(
+    "INSERT INTO daily_class_absence (absence_date, major_id, absences) "
+    "SELECT absence_date, :major_id, 1 FROM absences WHERE student_id = :student_id "
+    "ON CONFLICT (absence_date, major_id) DO UPDATE SET absences = absences + 1"
+)
+_REMOVE_STUDENT_DAYS = text(
+    "UPDATE daily_class_absence SET absences = absences - 1 "
+    "WHERE major_id = :major_id AND absence_date IN "
+    "(SELECT absence_date FROM absences WHERE student_id = :student_id)"
+)
+_DROP_EMPTY_DAYS = text(
+    "DELETE FROM daily_class_absence WHERE major_id = :major_id AND absences <= 0"
+)
+
+
+def record_absences(session: Session, absence_date: date, student_ids: Iterable[str]) -> None:
+    """Count newly inserted absences on ``absence_date`` against each student's class."""
+    student_ids = list(student_ids)
+    if not student_ids:
+        return
+    statement = sqlite_insert(DailyClassAbsence).from_select(
+        ["absence_date", "major_id", "absences"],
+        select(literal(absence_date), Student.major_id, func.count())
+        .where(Student.id.in_(student_ids))
+        .group_by(Student.major_id),
+    )
+    session.execute(
+        statement.on_conflict_do_update(
+            index_elements=["absence_date", "major_id"],
+            set_={"absences": DailyClassAbsence.absences + statement.excluded.absences},
+        )
+    )
+
+
+def move_student(
+    session: Session, student_id: str, old_major_id: int, new_major_id: Optional[int]
+) -> None:
+    """Move a student's absence days to ``new_major_id``, or drop them when ``None``.
+
+    Call it before the student's absences are deleted.
+    """
+    params = {"major_id": old_major_id, "student_id": student_id}
+    session.execute(_REMOVE_STUDENT_DAYS, params)
+    session.execute(_DROP_EMPTY_DAYS, params)
+    if new_major_id is not None:
+        session.execute(_ADD_STUDENT_DAYS, {"major_id": new_major_id, "student_id": student_id})
+
+
+def rebuild(session: Session) -> int:
+    """Recompute every count from ``absences``; returns the number of rows."""
+    for statement in REBUILD_SQL:
+        session.execute(text(statement))
+    return session.query(func.count()).select_from(DailyClassAbsence).scalar()
+
+
+def class_totals(
+    session: Session, start: date, end: date
+) -> tuple[tuple[str, str, int], ...]:
+    """Absences per class between ``start`` and ``end`` inclusive, most first."""
+    total = func.sum(DailyClassAbsence.absences)
+    return tuple(
+        tuple(row)
+        for row in session.execute(
+            select(Grade.name, Major.name, total)
+            .join(Major, Major.id == DailyClassAbsence.major_id)
+            .join(Grade, Grade.id == Major.grade_id)
+            .where(DailyClassAbsence.absence_date.between(start, end))
+            .group_by(DailyClassAbsence.major_id, Grade.name, Major.name)
+            .order_by(total.desc(), Grade.name, Major.name)
+        )
+    )
@@ -0,0 +1,126 @@
+"""Table-driven routing for callback queries."""
+from __future__ import annotations
+
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Optional
+
+LOGGER = logging.getLogger(__name__)
+
+ROLE_TEACHER = "teacher"
+ROLE_MANAGEMENT = "management"
+
+SLOW_ROUTE_SECONDS = 1.0
+
+RouteHandler = Callable[[Any, Any, str], Awaitable[None]]
+
+
+@dataclass
+class RouteStats:
+    calls: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+
+    @property
+    def mean_seconds(self) -> float:
+        return self.total_seconds / self.calls if self.calls else 0.0
+
+
+@dataclass(frozen=True)
+class Route:
+    pattern: str
+    handler: RouteHandler
+    role: str
+    denied_message: str
+
+
+@dataclass
+class _TrieNode:
+    children: dict[str, _TrieNode] = field(default_factory=dict)
+    route: Optional[Route] = None
+
+
+class CallbackRouter:
+    """Resolve callback data to a route in O(length of the data).
+
+    Exact routes are a single dict lookup. Prefix routes such as
+    ``absence:toggle:`` live in a trie keyed by ``:``-separated segments and
+    the longest registered prefix wins, so ``grade:edit:10th`` reaches the
+    ``grade:edit:`` route rather than a ``grade:`` route. The text after the prefix
+    is passed to the handler as its argument.
+    """
+
+    def __init__(self) -> None:
+        self._exact: dict[str, Route] = {}
+        self._prefixes = _TrieNode()
+        self.stats: dict[str, RouteStats] = {}
+
+    def exact(
+        self, data: str, *, role: str = ROLE_TEACHER, denied: str = ""
+    ) -> Callable[[RouteHandler], RouteHandler]:
+        def register(handler: RouteHandler) -> RouteHandler:
+            self._exact[data] = Route(data, handler, role, denied)
+            return handler
+
+        return register
+
+    def prefix(
+        self, prefix: str, *, role: str = ROLE_TEACHER, denied: str = ""
+    ) -> Callable[[RouteHandler], RouteHandler]:
+        if not prefix.endswith(":"):
+            raise ValueError("Prefix routes must end with ':'.")
+
+        def register(handler: RouteHandler) -> RouteHandler:
+            node = self._prefixes
+            for segment in prefix[:-1].split(":"):
+                node = node.children.setdefault(segment, _TrieNode())
+            node.route = Route(prefix, handler, role, denied)
+            return handler
+
+        return register
+
+    def resolve(self, data: str) -> Optional[tuple[Route, str]]:
+        route = self._exact.get(data)
+        if route is not None:
+            return route, ""
+
+        segments = data.split(":")
+        node = self._prefixes
+        match: Optional[tuple[Route, int]] = None
+        # The last segment is always the argument, never part of a prefix.
+        for index, segment in enumerate(segments[:-1]):
+            node = node.children.get(segment)
+            if node is None:
+                break
+            if node.route is not None:
+                match = (node.route, index + 1)
+        if match is None:
+            return None
+        route, consumed = match
+        return route, ":".join(segments[consumed:])
+
+    async def dispatch(self, route: Route, update: Any, context: Any, argument: str) -> None:
+        started = time.perf_counter()
+        try:
+            await route.handler(update, context, argument)
+        finally:
+            elapsed = time.perf_counter() - started
+            stats = self.stats.setdefault(route.pattern, RouteStats())
+            stats.calls += 1
+            stats.total_seconds += elapsed
+            stats.max_seconds = max(stats.max_seconds, elapsed)
+            if elapsed >= SLOW_ROUTE_SECONDS:
+                LOGGER.warning("Slow callback route %s took %.3fs", route.pattern, elapsed)
+
+    def log_stats(self) -> None:
+        for pattern, stats in sorted(
+            self.stats.items(), key=lambda item: item[1].total_seconds, reverse=True
+        ):
+            LOGGER.info(
+                "Route %s: %d call(s), mean %.1f ms, max %.1f ms",
+                pattern,
+                stats.calls,
+                stats.mean_seconds * 1000,
+                stats.max_seconds * 1000,
+            )
@@ -0,0 +1,199 @@
+"""Webhook serving mode for AbsenceBot.
+
+Telegram POSTs each update as JSON to ``WebhookConfig.url_path``. A standard
+library HTTP server runs in a background thread, checks the secret token
+header and hands the decoded update to the application's update queue on
+the event loop. No extra dependencies are needed, TLS can be terminated
+by a reverse proxy (as on cPanel) or by the server itself, and recorded
+updates can be replayed against a local instance with
+``python -m absence_bot replay``.
+"""
+from __future__ import annotations
+
+import asyncio
+import hmac
+import json
+import logging
+import signal
+import ssl
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Coroutine
+
+from telegram import Update
+from telegram.ext import Application
+
+from absence_bot.config import WebhookConfig
+
+LOGGER = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+MAX_BODY_BYTES = 1024 * 1024
+ENQUEUE_TIMEOUT_SECONDS = 10
+# Applies to the TLS handshake and to every read and write on a connection,
+# so an idle or slow client cannot hold a worker thread for long.
+CONNECTION_TIMEOUT_SECONDS = 10
+# Telegram opens at most 40 connections to a webhook by default.
+MAX_CONNECTIONS = 40
+
+Enqueue = Callable[[Any], Coroutine[Any, Any, None]]
+
+
+class _WebhookServer(ThreadingHTTPServer):
+    """Threaded HTTP(S) server with a bounded number of open connections.
+
+    The TLS handshake runs on the connection's worker thread under
+    ``CONNECTION_TIMEOUT_SECONDS`` rather than in ``accept()``, so a
+    client that connects and never sends a ClientHello cannot stall the
+    accept loop. Connections beyond ``MAX_CONNECTIONS`` are closed at once.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        config: WebhookConfig,
+        loop: asyncio.AbstractEventLoop,
+        enqueue: Enqueue,
+    ) -> None:
+        super().__init__((config.listen, config.port), _WebhookRequestHandler)
+        self.config = config
+        self.loop = loop
+        self.enqueue = enqueue
+        self._slots = threading.BoundedSemaphore(MAX_CONNECTIONS)
+        if config.cert_path and config.key_path:
+            context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+            context.load_cert_chain(config.cert_path, config.key_path)
+            self.socket = context.wrap_socket(
+                self.socket, server_side=True, do_handshake_on_connect=False
+            )
+
+    def process_request(self, request: Any, client_address: Any) -> None:
+        if not self._slots.acquire(blocking=False):
+            LOGGER.warning(
+                "Webhook connection from %s dropped: %d already open",
+                client_address[0],
+                MAX_CONNECTIONS,
+            )
+            self.shutdown_request(request)
+            return
+        try:
+            super().process_request(request, client_address)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def process_request_thread(self, request: Any, client_address: Any) -> None:
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self._slots.release()
+
+    def finish_request(self, request: Any, client_address: Any) -> None:
+        if isinstance(request, ssl.SSLSocket):
+            request.settimeout(CONNECTION_TIMEOUT_SECONDS)
+            try:
+                request.do_handshake()
+            except OSError as exc:
+                LOGGER.debug("Webhook TLS handshake with %s failed: %s", client_address[0], exc)
+                return
+        super().finish_request(request, client_address)
+
+
+class _WebhookRequestHandler(BaseHTTPRequestHandler):
+    server: _WebhookServer
+    timeout = CONNECTION_TIMEOUT_SECONDS
+
+    def do_POST(self) -> None:  # noqa: N802
+        config = self.server.config
+        if self.path != config.url_path:
+            self._respond(HTTPStatus.NOT_FOUND)
+            return
+        secret = self.headers.get(SECRET_HEADER, "")
+        if not hmac.compare_digest(secret.encode(), config.secret_token.encode()):
+            self._respond(HTTPStatus.FORBIDDEN)
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", "0"))
+        except ValueError:
+            self._respond(HTTPStatus.BAD_REQUEST)
+            return
+        if length <= 0 or length > MAX_BODY_BYTES:
+            self._respond(HTTPStatus.BAD_REQUEST)
+            return
+        try:
+            payload = json.loads(self.rfile.read(length))
+        except ValueError:
+            self._respond(HTTPStatus.BAD_REQUEST)
+            return
+
+        future = asyncio.run_coroutine_threadsafe(self.server.enqueue(payload), self.server.loop)
+        try:
+            future.result(timeout=ENQUEUE_TIMEOUT_SECONDS)
+        except Exception as exc:  # noqa: BLE001
+            LOGGER.exception("Unable to queue webhook update: %s", exc)
+            self._respond(HTTPStatus.INTERNAL_SERVER_ERROR)
+            return
+        self._respond(HTTPStatus.OK)
+
+    def _respond(self, status: HTTPStatus) -> None:
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        LOGGER.debug("Webhook %s - %s", self.address_string(), format % args)
+
+
+async def serve_webhook(application: Application, config: WebhookConfig) -> None:
+    """Run ``application`` behind the webhook server until SIGINT/SIGTERM.
+
+    Mirrors ``Application.run_polling``: the post_init and post_shutdown
+    hooks run, and updates already queued are processed before shutdown.
+    """
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    async def enqueue(payload: Any) -> None:
+        await application.update_queue.put(Update.de_json(payload, application.bot))
+
+    await application.initialize()
+    try:
+        if application.post_init:
+            await application.post_init(application)
+        server = _WebhookServer(config, loop, enqueue)
+        thread = threading.Thread(
+            target=server.serve_forever, name="absence-bot-webhook", daemon=True
+        )
+        thread.start()
+        try:
+            await application.start()
+            if config.public_url:
+                await application.bot.set_webhook(
+                    url=f"{config.public_url}{config.url_path}",
+                    secret_token=config.secret_token,
+                    max_connections=MAX_CONNECTIONS,
+                    allowed_updates=Update.ALL_TYPES,
+                )
+                LOGGER.info("Registered webhook %s%s", config.public_url, config.url_path)
+            LOGGER.info(
+                "Webhook listening on %s:%d%s", config.listen, config.port, config.url_path
+            )
+            await stop.wait()
+        finally:
+            LOGGER.info("Stopping webhook server")
+            await loop.run_in_executor(None, server.shutdown)
+            server.server_close()
+            if application.running:
+                await application.stop()
+    finally:
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
@@ -0,0 +1 @@
+"""Benchmarks for AbsenceBot. Run modules with ``python -m benchmarks.<name>``."""
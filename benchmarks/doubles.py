@@ -0,0 +1,152 @@
+"""In-process stand-ins for the Telegram objects the handlers touch.
+
+They carry just the attributes and coroutines the handlers use, answer
+every call at once and never reach the network. :class:`Chat` ties them
+together: it taps buttons and sends text the way one user would, and
+keeps the message currently on screen so the next tap can use its
+keyboard.
+"""
+from __future__ import annotations
+
+import itertools
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import Any, Optional
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from absence_bot.handlers import handle_callback, handle_message
+
+UNEXPECTED_ERROR = "An unexpected error occurred"
+
+
+class FakeBot:
+    """Records what would have been sent instead of calling the Bot API."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.uploaded_bytes = 0
+        self._message_ids = itertools.count(1000)
+
+    def message(self, chat_id: int, text: Optional[str] = None, reply_markup: Any = None):
+        return FakeMessage(self, chat_id, next(self._message_ids), text, reply_markup)
+
+    async def send_message(self, chat_id: int, text: str, reply_markup: Any = None, **kwargs):
+        self.calls += 1
+        return self.message(chat_id, text, reply_markup)
+
+    async def send_document(self, chat_id: int, document: Any, **kwargs):
+        self.calls += 1
+        if hasattr(document, "read"):
+            self.uploaded_bytes += len(document.read())
+        return SimpleNamespace(document=SimpleNamespace(file_id="fake-file-id"))
+
+    async def edit_message_text(self, text: str, chat_id: int = 0, message_id: int = 0, **kwargs):
+        self.calls += 1
+        return True
+
+    async def edit_message_reply_markup(self, chat_id: int = 0, message_id: int = 0, **kwargs):
+        self.calls += 1
+        return True
+
+
+@dataclass
+class FakeMessage:
+    bot: FakeBot
+    chat_id: int
+    message_id: int
+    text: Optional[str] = None
+    reply_markup: Optional[InlineKeyboardMarkup] = None
+    chat: Optional[Chat] = None
+
+    async def reply_text(self, text: str, reply_markup: Any = None, **kwargs) -> FakeMessage:
+        self.bot.calls += 1
+        message = self.bot.message(self.chat_id, text, reply_markup)
+        if self.chat is not None:
+            message.chat = self.chat
+            self.chat.screen = message
+        return message
+
+    async def edit_text(self, text: str, reply_markup: Any = None, **kwargs) -> FakeMessage:
+        self.bot.calls += 1
+        self.text, self.reply_markup = text, reply_markup
+        return self
+
+
+@dataclass
+class FakeCallbackQuery:
+    data: str
+    message: FakeMessage
+
+    async def answer(self, *args, **kwargs) -> bool:
+        return True
+
+    async def edit_message_text(self, text: str, reply_markup: Any = None, **kwargs):
+        return await self.message.edit_text(text, reply_markup=reply_markup)
+
+    async def edit_message_reply_markup(self, reply_markup: Any = None, **kwargs):
+        self.message.bot.calls += 1
+        self.message.reply_markup = reply_markup
+        return self.message
+
+
+@dataclass
+class FakeUpdate:
+    effective_user: SimpleNamespace
+    message: Optional[FakeMessage] = None
+    callback_query: Optional[FakeCallbackQuery] = None
+
+    @property
+    def effective_chat(self) -> SimpleNamespace:
+        return SimpleNamespace(id=self.effective_user.id)
+
+
+@dataclass
+class FakeContext:
+    bot: FakeBot
+    bot_data: dict
+    user_data: dict = field(default_factory=dict)
+    chat_data: dict = field(default_factory=dict)
+
+
+class Chat:
+    """One user's private chat with the bot.
+
+    A handler that fails shows its generic error message instead of
+    raising; the chat raises it again, so a benchmark never times an
+    error path by mistake.
+    """
+
+    def __init__(self, bot: FakeBot, bot_data: dict, user_id: int) -> None:
+        self.user = SimpleNamespace(id=user_id)
+        self.context = FakeContext(bot, bot_data)
+        self.screen = bot.message(user_id)
+        self.screen.chat = self
+
+    def buttons(self) -> list[InlineKeyboardButton]:
+        markup = self.screen.reply_markup
+        if markup is None:
+            return []
+        return [button for row in markup.inline_keyboard for button in row]
+
+    async def tap(self, data: str) -> None:
+        query = FakeCallbackQuery(data, self.screen)
+        await handle_callback(FakeUpdate(self.user, callback_query=query), self.context)
+        self._check(data)
+
+    async def tap_label(self, label: str) -> None:
+        for button in self.buttons():
+            if button.text == label:
+                await self.tap(button.callback_data)
+                return
+        raise LookupError(f"No {label!r} button on screen: {self.screen.text!r}")
+
+    async def send(self, text: str) -> None:
+        message = self.context.bot.message(self.user.id, text)
+        message.chat = self
+        await handle_message(FakeUpdate(self.user, message=message), self.context)
+        self._check(text)
+
+    def _check(self, sent: str) -> None:
+        if (self.screen.text or "").startswith(UNEXPECTED_ERROR):
+            raise RuntimeError(f"The bot failed handling {sent!r}")
@@ -0,0 +1,329 @@
+"""Handler latency and query counts on a synthetic school, end to end.
+
+Generates a school with :mod:`benchmarks.school` and drives
+``handle_callback`` and ``handle_message`` through the Telegram doubles in
+:mod:`benchmarks.doubles`, tapping the buttons each screen shows. Four
+paths are timed, each as a whole flow from its menu entry:
+
+* ``roll_call``: pick a class, mark five students absent and confirm.
+* ``report``: top absentees, one class on today's date and one student's
+  history, with the report cache dropped first.
+* ``export``: the manual database export and an all-time absences CSV.
+* ``import``: pick a class and paste a batch of new students.
+
+Run with::
+
+    python -m benchmarks.end_to_end [--preset small] [--iterations 50]
+    python -m benchmarks.end_to_end --preset medium --save-baseline
+    python -m benchmarks.end_to_end --preset medium --compare
+
+Baselines are JSON files in ``benchmarks/baselines``. ``--compare`` fails
+when a path runs more queries than its baseline or its p95 latency grows
+past ``--tolerance`` times the baseline.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import shutil
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass, replace
+from datetime import date
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy import event
+
+from absence_bot.cache import AuthorizationCache, CatalogCache, RosterCache, TtlLruCache
+from absence_bot.config import BotConfig, DatabaseConfig
+from absence_bot.database import Database, close_database, create_database
+from absence_bot.handlers import HandlerContext
+from absence_bot.render import EditCoalescer, RenderedViews
+from benchmarks.doubles import Chat, FakeBot
+from benchmarks.school import PRESETS, SchoolShape, generate_school, plan_school
+
+BASELINE_DIR = Path(__file__).parent / "baselines"
+USER_ID = 1
+ROLL_CALL_ABSENT = 5
+UNSELECTED = "⬜️ "
+# Mean query counts move a little with the iteration count as caches warm.
+QUERY_SLACK = 0.5
+PATH_NAMES = ("roll_call", "report", "export", "import")
+
+Classes = tuple[tuple[str, str], ...]
+
+
+@dataclass(frozen=True)
+class PathResult:
+    runs: int
+    p50: float
+    p95: float
+    p99: float
+    queries: float
+
+    def row(self, name: str) -> str:
+        return (
+            f"{name:<10} {self.runs:5}  p50 {self.p50:8.2f} ms  p95 {self.p95:8.2f} ms  "
+            f"p99 {self.p99:8.2f} ms  queries {self.queries:6.1f}"
+        )
+
+
+def _percentile(ordered: list[float], fraction: float) -> float:
+    return ordered[max(math.ceil(len(ordered) * fraction) - 1, 0)]
+
+
+class _QueryCounter:
+    def __init__(self, database: Database) -> None:
+        self.count = 0
+        event.listen(database.engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args) -> None:
+        self.count += 1
+
+
+async def _roll_call(chat: Chat, classes: Classes, iteration: int) -> None:
+    grade, major = classes[iteration % len(classes)]
+    await chat.tap("menu:absence")
+    await chat.tap_label(grade)
+    await chat.tap_label(major)
+    students = [button for button in chat.buttons() if button.text.startswith(UNSELECTED)]
+    for button in students[:ROLL_CALL_ABSENT]:
+        await chat.tap(button.callback_data)
+    await chat.tap("absence:confirm")
+
+
+def _import(batch: int) -> Callable[[Chat, Classes, int], Awaitable[None]]:
+    async def run(chat: Chat, classes: Classes, iteration: int) -> None:
+        grade, major = classes[iteration % len(classes)]
+        await chat.tap("students:add")
+        await chat.tap_label(grade)
+        await chat.tap_label(major)
+        await chat.send(
+            "\n".join(
+                f"N{iteration:05}{index:03},New Student {iteration:05}-{index:03}"
+                for index in range(batch)
+            )
+        )
+
+    return run
+
+
+async def _report(chat: Chat, classes: Classes, iteration: int) -> None:
+    grade, major = classes[iteration % len(classes)]
+    chat.context.bot_data["handler_context"].report_cache.invalidate()
+    await chat.tap("menu:reports")
+    top = next(
+        button for button in chat.buttons() if button.callback_data.startswith("report:top:")
+    )
+    await chat.tap(top.callback_data)
+    await chat.tap("report:class")
+    await chat.tap_label(grade)
+    await chat.tap_label(major)
+    await chat.tap("report:student")
+    await chat.tap_label(grade)
+    await chat.tap_label(major)
+    await chat.tap(chat.buttons()[0].callback_data)
+
+
+async def _export(chat: Chat, classes: Classes, iteration: int) -> None:
+    await chat.tap("management:export")
+    await chat.tap("report:csv")
+    await chat.tap("csv:range:0")
+    await chat.tap("csv:all")
+
+
+async def _measure(
+    chat: Chat,
+    counter: _QueryCounter,
+    classes: Classes,
+    run: Callable[[Chat, Classes, int], Awaitable[None]],
+    iterations: int,
+    offset: int,
+) -> PathResult:
+    timings: list[float] = []
+    queries: list[int] = []
+    for iteration in range(offset, offset + iterations):
+        before = counter.count
+        started = time.perf_counter()
+        await run(chat, classes, iteration)
+        timings.append((time.perf_counter() - started) * 1000)
+        queries.append(counter.count - before)
+    ordered = sorted(timings)
+    return PathResult(
+        runs=iterations,
+        p50=_percentile(ordered, 0.50),
+        p95=_percentile(ordered, 0.95),
+        p99=_percentile(ordered, 0.99),
+        queries=sum(queries) / len(queries),
+    )
+
+
+def _prepare_school(
+    shape: SchoolShape, path: Path, cache_dir: Optional[Path]
+) -> Optional[int]:
+    """Generate ``shape`` into ``path``; ``None`` when a cached copy was reused."""
+    if cache_dir is not None:
+        key = hashlib.blake2b(
+            json.dumps(asdict(shape), sort_keys=True).encode(), digest_size=8
+        ).hexdigest()
+        cached = cache_dir / f"school-{key}.sqlite3"
+        if cached.exists():
+            shutil.copyfile(cached, path)
+            return None
+    database = create_database(DatabaseConfig(sqlite_path=str(path)))
+    try:
+        absences = generate_school(database, shape, date.today())
+    finally:
+        close_database(database)
+    if cache_dir is not None:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(path, cached)
+    return absences
+
+
+async def _run_paths(
+    database: Database, config: BotConfig, classes: Classes, args: argparse.Namespace
+) -> dict[str, PathResult]:
+    handler_context = HandlerContext(
+        config=config,
+        database=database,
+        authorization=AuthorizationCache([USER_ID]),
+        rosters=RosterCache(config.roster_cache_size, config.roster_cache_ttl_seconds),
+        report_cache=TtlLruCache(config.report_cache_size, config.report_cache_ttl_seconds),
+        # No coalescing delay, so every toggle's edit is part of the measurement.
+        edits=EditCoalescer(0),
+        views=RenderedViews(),
+        catalog=CatalogCache(),
+    )
+    chat = Chat(FakeBot(), {"handler_context": handler_context}, USER_ID)
+    counter = _QueryCounter(database)
+    paths = (
+        ("roll_call", _roll_call, args.iterations),
+        ("report", _report, args.iterations),
+        ("export", _export, args.export_iterations),
+        # Last, so the imported students do not show up in the other paths.
+        ("import", _import(args.import_batch), args.iterations),
+    )
+    results = {}
+    for name, run, iterations in paths:
+        if name not in args.paths:
+            continue
+        # One untimed pass so every path starts with warm caches.
+        await _measure(chat, counter, classes, run, 1, 0)
+        results[name] = await _measure(chat, counter, classes, run, iterations, 1)
+    return results
+
+
+def _compare(results: dict[str, PathResult], baseline: dict, tolerance: float) -> bool:
+    passed = True
+    for name, result in results.items():
+        expected = baseline["paths"].get(name)
+        if expected is None:
+            print(f"{name:<10} no baseline")
+            continue
+        ratio = result.p95 / expected["p95"] if expected["p95"] else math.inf
+        verdict = "ok"
+        if result.queries > expected["queries"] + QUERY_SLACK:
+            verdict = "REGRESSION: more queries"
+        elif ratio > tolerance:
+            verdict = "REGRESSION: slower"
+        passed = passed and verdict == "ok"
+        print(
+            f"{name:<10} p95 {ratio:5.2f}x baseline  "
+            f"queries {result.queries:6.1f} vs {expected['queries']:6.1f}  {verdict}"
+        )
+    return passed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="small")
+    parser.add_argument("--grades", type=int)
+    parser.add_argument("--majors", type=int, help="Majors per grade.")
+    parser.add_argument("--students", type=int)
+    parser.add_argument("--years", type=float)
+    parser.add_argument("--absence-rate", type=float)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--export-iterations", type=int, default=5)
+    parser.add_argument("--import-batch", type=int, default=30)
+    parser.add_argument("--paths", nargs="+", choices=PATH_NAMES, default=list(PATH_NAMES))
+    parser.add_argument("--page-size", type=int, default=10)
+    parser.add_argument(
+        "--cache-dir", type=Path, help="Keep generated schools here and reuse them."
+    )
+    parser.add_argument("--baseline", help="Baseline name; defaults to the preset.")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=1.5)
+    args = parser.parse_args()
+
+    overrides = {
+        field: value
+        for field, value in (
+            ("grades", args.grades),
+            ("majors", args.majors),
+            ("students", args.students),
+            ("years", args.years),
+            ("absence_rate", args.absence_rate),
+        )
+        if value is not None
+    }
+    if overrides and (args.save_baseline or args.compare) and args.baseline is None:
+        parser.error("name the baseline with --baseline when overriding the preset shape")
+    shape = replace(PRESETS[args.preset], **overrides)
+    baseline_path = BASELINE_DIR / f"{args.baseline or args.preset}.json"
+    if args.compare and not baseline_path.exists():
+        parser.error(f"no baseline at {baseline_path}")
+
+    classes, _ = plan_school(shape)
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "school.sqlite3"
+        started = time.perf_counter()
+        absences = _prepare_school(shape, path, args.cache_dir)
+        generated = "reused" if absences is None else f"{absences} absences generated"
+        print(f"{shape.describe()}: {generated} in {time.perf_counter() - started:.1f}s")
+
+        database_config = DatabaseConfig(sqlite_path=str(path))
+        database = create_database(database_config)
+        try:
+            config = BotConfig(
+                token="",
+                timezone="UTC",
+                authorized_teacher_ids=[],
+                management_user_ids=[USER_ID],
+                page_size=args.page_size,
+                database=database_config,
+            )
+            results = asyncio.run(_run_paths(database, config, classes, args))
+        finally:
+            close_database(database)
+
+    for name, result in results.items():
+        print(result.row(name))
+    if args.save_baseline:
+        BASELINE_DIR.mkdir(exist_ok=True)
+        baseline = {
+            "shape": asdict(shape),
+            "iterations": args.iterations,
+            "paths": {
+                name: {key: round(value, 3) for key, value in asdict(result).items()}
+                for name, result in results.items()
+            },
+        }
+        baseline_path.write_text(json.dumps(baseline, indent=2) + "\n")
+        print(f"Saved {baseline_path}")
+    if args.compare:
+        baseline = json.loads(baseline_path.read_text())
+        if baseline["shape"] != asdict(shape) or baseline["iterations"] != args.iterations:
+            print("Warning: the baseline was recorded with a different shape or iteration count.")
+        if not _compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Roster page reads through the ORM versus the cached lambda statements.
+
+Each iteration fetches one roster page in its own session, as a handler
+does: once hydrating full ``Student`` entities, once with an ORM column
+query built per call (the handlers' previous path) and once through
+:mod:`absence_bot.queries`. Run with::
+
+    python -m benchmarks.read_queries [--calls 2000] [--page-size 10]
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+
+from absence_bot import queries
+from absence_bot.cache import RosterEntry, RosterPage
+from absence_bot.config import DatabaseConfig
+from absence_bot.database import Database, close_database, create_database, session_scope
+from absence_bot.handlers import _insert_grade, _insert_major, _insert_students
+from absence_bot.models import Student
+
+GRADE = "10th"
+MAJOR = "Science"
+
+
+def _orm_entities(session: Session, after, limit: int) -> RosterPage:
+    query = session.query(Student).filter(Student.major_id == queries.class_id(GRADE, MAJOR))
+    if after is not None:
+        query = query.filter(tuple_(Student.full_name, Student.id) > tuple_(*after))
+    rows = query.order_by(Student.full_name, Student.id).limit(limit + 1).all()
+    entries = tuple(RosterEntry(row.id, row.full_name) for row in rows[:limit])
+    return RosterPage(entries=entries, has_next=len(rows) > limit)
+
+
+def _orm_columns(session: Session, after, limit: int) -> RosterPage:
+    query = session.query(Student.id, Student.full_name).filter(
+        Student.major_id == queries.class_id(GRADE, MAJOR)
+    )
+    if after is not None:
+        query = query.filter(tuple_(Student.full_name, Student.id) > tuple_(*after))
+    rows = query.order_by(Student.full_name, Student.id).limit(limit + 1).all()
+    entries = tuple(RosterEntry(row.id, row.full_name) for row in rows[:limit])
+    return RosterPage(entries=entries, has_next=len(rows) > limit)
+
+
+def _lambda(session: Session, after, limit: int) -> RosterPage:
+    return queries.roster_page(session, GRADE, MAJOR, after, limit)
+
+
+def _measure(
+    database: Database, fetch: Callable[[Session, object, int], RosterPage], calls: int, limit: int
+) -> list[float]:
+    timings: list[float] = []
+    after = None
+    for _ in range(calls):
+        started = time.perf_counter()
+        with session_scope(database) as session:
+            page = fetch(session, after, limit)
+        timings.append((time.perf_counter() - started) * 1000)
+        # Walk the class page by page and wrap around at the end.
+        last = page.entries[-1]
+        after = (last.full_name, last.id) if page.has_next else None
+    return timings
+
+
+def _report(name: str, timings: list[float]) -> None:
+    ordered = sorted(timings)
+    p95 = ordered[int(len(ordered) * 0.95) - 1]
+    print(
+        f"{name:<13} mean {statistics.mean(ordered):7.3f} ms  "
+        f"p50 {statistics.median(ordered):7.3f} ms  p95 {p95:7.3f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--page-size", type=int, default=10)
+    parser.add_argument("--students", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database = create_database(
+            DatabaseConfig(sqlite_path=str(Path(directory) / "read.sqlite3"))
+        )
+        try:
+            with session_scope(database) as session:
+                _insert_grade(session, GRADE)
+                _insert_major(session, GRADE, MAJOR)
+                _insert_students(
+                    session,
+                    GRADE,
+                    MAJOR,
+                    [(f"S{index:05}", f"Student {index:05}") for index in range(args.students)],
+                )
+            for name, fetch in (
+                ("orm entities", _orm_entities),
+                ("orm columns", _orm_columns),
+                ("lambda", _lambda),
+            ):
+                # One untimed pass so every path starts with warm caches.
+                _measure(database, fetch, 10, args.page_size)
+                _report(name, _measure(database, fetch, args.calls, args.page_size))
+        finally:
+            close_database(database)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Synthetic schools for the end-to-end benchmarks.
+
+A school is described by a :class:`SchoolShape` and generated into a
+SQLite file through the bot's own schema: grades, majors and students go
+through the handlers' insert helpers, absences are bulk-inserted for every
+weekday of the requested number of years and the per-class rollup is
+rebuilt from them. Generation is seeded, so one shape always yields the
+same school.
+"""
+from __future__ import annotations
+
+import random
+from dataclasses import dataclass
+from datetime import date, datetime, time as clock, timedelta
+from typing import Iterator
+
+from sqlalchemy import insert, text
+
+from absence_bot import rollups
+from absence_bot.database import Database, session_scope
+from absence_bot.handlers import _insert_grade, _insert_major, _insert_students
+from absence_bot.models import Absence
+
+ABSENCE_CHUNK_ROWS = 50_000
+TEACHER_ID = 1
+
+
+@dataclass(frozen=True)
+class SchoolShape:
+    grades: int
+    majors: int
+    students: int
+    years: float
+    absence_rate: float
+    seed: int = 1
+
+    def describe(self) -> str:
+        return (
+            f"{self.grades} grades x {self.majors} majors, {self.students} students, "
+            f"{self.years:g} year(s) at {self.absence_rate:.0%} absence"
+        )
+
+
+PRESETS = {
+    "small": SchoolShape(grades=3, majors=4, students=300, years=1, absence_rate=0.05),
+    "medium": SchoolShape(grades=6, majors=6, students=2_000, years=2, absence_rate=0.06),
+    # About 5M absences: 20k students over five years of weekdays.
+    "large": SchoolShape(grades=10, majors=20, students=20_000, years=5, absence_rate=0.19),
+}
+
+
+def grade_name(index: int) -> str:
+    return f"G{index + 1:02}"
+
+
+def major_name(index: int) -> str:
+    return f"Major {index + 1:02}"
+
+
+def school_days(first: date, last: date) -> Iterator[date]:
+    day = first
+    while day <= last:
+        if day.weekday() < 5:
+            yield day
+        day += timedelta(days=1)
+
+
+def plan_school(shape: SchoolShape) -> tuple[tuple[tuple[str, str], ...], dict]:
+    """The classes of ``shape`` and the student ids in each, in class order."""
+    classes = tuple(
+        (grade_name(grade), major_name(major))
+        for grade in range(shape.grades)
+        for major in range(shape.majors)
+    )
+    roster: dict[tuple[str, str], list[str]] = {key: [] for key in classes}
+    for index in range(shape.students):
+        roster[classes[index % len(classes)]].append(f"S{index:06}")
+    return classes, {key: tuple(members) for key, members in roster.items()}
+
+
+def generate_school(database: Database, shape: SchoolShape, today: date) -> int:
+    """Fill an empty database with ``shape`` and return the number of absences.
+
+    Absences run up to the day before ``today``.
+    """
+    generator = random.Random(shape.seed)
+    classes, roster = plan_school(shape)
+    student_ids = [student_id for members in roster.values() for student_id in members]
+    student_ids.sort()
+
+    with session_scope(database) as session:
+        for grade, major in classes:
+            if major == major_name(0):
+                _insert_grade(session, grade)
+            _insert_major(session, grade, major)
+        for (grade, major), members in roster.items():
+            _insert_students(
+                session,
+                grade,
+                major,
+                [(student_id, f"Student {student_id}") for student_id in members],
+            )
+
+    last_day = today - timedelta(days=1)
+    first_day = today - timedelta(days=round(shape.years * 365))
+    absences = 0
+    chunk: list[dict] = []
+    with database.engine.begin() as connection:
+        for day in school_days(first_day, last_day):
+            # Vary the day's absence count around the rate, as real days do.
+            count = round(len(student_ids) * shape.absence_rate * generator.uniform(0.5, 1.5))
+            created_at = datetime.combine(day, clock(8, 15))
+            for student_id in generator.sample(student_ids, min(count, len(student_ids))):
+                chunk.append(
+                    {
+                        "student_id": student_id,
+                        "teacher_id": TEACHER_ID,
+                        "absence_date": day,
+                        "created_at": created_at,
+                    }
+                )
+            if len(chunk) >= ABSENCE_CHUNK_ROWS:
+                connection.execute(insert(Absence), chunk)
+                absences += len(chunk)
+                chunk.clear()
+        if chunk:
+            connection.execute(insert(Absence), chunk)
+            absences += len(chunk)
+
+    with session_scope(database) as session:
+        rollups.rebuild(session)
+        # The generated rows are the starting point, not changes to export.
+        session.execute(text("DELETE FROM change_log"))
+    with database.engine.begin() as connection:
+        connection.execute(text("ANALYZE"))
+    return absences
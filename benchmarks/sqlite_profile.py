@@ -0,0 +1,64 @@
+"""Commit latency with and without the SQLite performance profile.
+
+Each iteration commits one small absence batch in its own transaction, the
+same shape of write as confirming a roll call. Run with::
+
+    python -m benchmarks.sqlite_profile [--commits 500]
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+from absence_bot.config import DatabaseConfig, SqliteProfile
+from absence_bot.database import close_database, create_database, session_scope
+from absence_bot.handlers import _insert_absences
+
+
+def _measure(path: Path, profile: Optional[SqliteProfile], commits: int) -> list[float]:
+    database = create_database(DatabaseConfig(sqlite_path=str(path), sqlite_profile=profile))
+    timings: list[float] = []
+    day = date(2024, 1, 1)
+    try:
+        for index in range(commits):
+            started = time.perf_counter()
+            with session_scope(database) as session:
+                _insert_absences(
+                    session,
+                    [f"S{index}-{seat}" for seat in range(5)],
+                    1,
+                    day + timedelta(days=index),
+                    datetime.now(),
+                )
+            timings.append((time.perf_counter() - started) * 1000)
+    finally:
+        close_database(database)
+    return timings
+
+
+def _report(name: str, timings: list[float]) -> None:
+    ordered = sorted(timings)
+    p95 = ordered[int(len(ordered) * 0.95) - 1]
+    print(
+        f"{name:<12} mean {statistics.mean(ordered):7.3f} ms  "
+        f"p50 {statistics.median(ordered):7.3f} ms  p95 {p95:7.3f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--commits", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name, profile in (("no profile", None), ("performance", SqliteProfile())):
+            _report(name, _measure(Path(directory) / f"{name}.sqlite3", profile, args.commits))
+
+
+if __name__ == "__main__":
+    main()
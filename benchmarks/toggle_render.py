@@ -0,0 +1,139 @@
+"""Per-tap cost of re-rendering the absence list versus patching one button.
+
+Each iteration toggles one student on a full roster page, the way a teacher
+taps through a roll call. The full path rebuilds the page from the roster
+cache and resends the text and keyboard; the incremental path relabels the
+tapped button in the stored keyboard and sends only the markup. Telegram is
+replaced by a stub that records the request size, and edits are sent
+without the usual coalescing delay so every tap is measured. Run with::
+
+    python -m benchmarks.toggle_render [--taps 2000] [--page-size 10] [--cold]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+from absence_bot.cache import AuthorizationCache, CatalogCache, RosterCache, TtlLruCache
+from absence_bot.config import BotConfig, DatabaseConfig
+from absence_bot.database import close_database, create_database, session_scope
+from absence_bot.handlers import (
+    STATE_ABSENCE_VIEW,
+    STATE_GRADE,
+    STATE_MAJOR,
+    HandlerContext,
+    _insert_grade,
+    _insert_major,
+    _insert_students,
+    _show_absence_list,
+    _toggle_absence_student,
+)
+from absence_bot.render import EditCoalescer, RenderedViews
+
+
+class _Query:
+    def __init__(self) -> None:
+        self.message = SimpleNamespace(chat_id=1, message_id=1)
+        self.sent_bytes: list[int] = []
+
+    async def edit_message_text(self, text, reply_markup=None, **kwargs) -> None:
+        self._record({"text": text, "reply_markup": reply_markup.to_dict()})
+
+    async def edit_message_reply_markup(self, reply_markup=None, **kwargs) -> None:
+        self._record({"reply_markup": reply_markup.to_dict()})
+
+    def _record(self, payload: dict) -> None:
+        self.sent_bytes.append(len(json.dumps(payload, ensure_ascii=False).encode()))
+
+
+async def _measure(
+    handler_context: HandlerContext, page_size: int, taps: int, incremental: bool, cold: bool
+) -> tuple[list[float], list[int]]:
+    query = _Query()
+    update = SimpleNamespace(callback_query=query)
+    context = SimpleNamespace(
+        bot_data={"handler_context": handler_context},
+        user_data={STATE_GRADE: "10th", STATE_MAJOR: "Science"},
+    )
+    await _show_absence_list(update, context)
+    query.sent_bytes.clear()
+
+    timings: list[float] = []
+    for index in range(taps):
+        if not incremental:
+            context.user_data.pop(STATE_ABSENCE_VIEW, None)
+        if cold:
+            handler_context.rosters.invalidate()
+        started = time.perf_counter()
+        await _toggle_absence_student(update, context, f"S{index % page_size:05}")
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings, query.sent_bytes
+
+
+def _report(name: str, timings: list[float], sent_bytes: list[int]) -> None:
+    ordered = sorted(timings)
+    p95 = ordered[int(len(ordered) * 0.95) - 1]
+    print(
+        f"{name:<12} mean {statistics.mean(ordered):7.3f} ms  "
+        f"p50 {statistics.median(ordered):7.3f} ms  p95 {p95:7.3f} ms  "
+        f"request {statistics.mean(sent_bytes):6.0f} B"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--taps", type=int, default=2000)
+    parser.add_argument("--page-size", type=int, default=10)
+    parser.add_argument("--students", type=int, default=40)
+    parser.add_argument(
+        "--cold", action="store_true", help="Drop the roster cache before every tap."
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database_config = DatabaseConfig(sqlite_path=str(Path(directory) / "toggle.sqlite3"))
+        database = create_database(database_config)
+        try:
+            with session_scope(database) as session:
+                _insert_grade(session, "10th")
+                _insert_major(session, "10th", "Science")
+                _insert_students(
+                    session,
+                    "10th",
+                    "Science",
+                    [(f"S{index:05}", f"Student {index:05}") for index in range(args.students)],
+                )
+            handler_context = HandlerContext(
+                config=BotConfig(
+                    token="",
+                    timezone="UTC",
+                    authorized_teacher_ids=[],
+                    management_user_ids=[],
+                    page_size=args.page_size,
+                    database=database_config,
+                ),
+                database=database,
+                authorization=AuthorizationCache([]),
+                rosters=RosterCache(16, 300),
+                report_cache=TtlLruCache(16, 300),
+                edits=EditCoalescer(0),
+                views=RenderedViews(),
+                catalog=CatalogCache(),
+            )
+            for name, incremental in (("full", False), ("incremental", True)):
+                timings, sent_bytes = asyncio.run(
+                    _measure(handler_context, args.page_size, args.taps, incremental, args.cold)
+                )
+                _report(name, timings, sent_bytes)
+        finally:
+            close_database(database)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,16 +3,15 @@
 CREATE TABLE students (
     id VARCHAR(32) PRIMARY KEY,
     full_name VARCHAR(200) NOT NULL,
-    grade VARCHAR(20) NOT NULL,
-    major VARCHAR(100) NOT NULL,
-    UNIQUE KEY uq_student_name_grade_major (full_name, grade, major)
+    major_id INT NOT NULL REFERENCES majors (id),
+    UNIQUE KEY uq_student_class_name (major_id, full_name)
 );
 
 CREATE TABLE majors (
     id INT AUTO_INCREMENT PRIMARY KEY,
-    grade VARCHAR(20) NOT NULL,
+    grade_id INT NOT NULL REFERENCES grades (id),
     name VARCHAR(100) NOT NULL,
-    UNIQUE KEY uq_major_grade_name (grade, name)
+    UNIQUE KEY uq_major_grade_name (grade_id, name)
 );
 
 CREATE TABLE absences (
@@ -23,3 +22,44 @@ CREATE TABLE absences (
     created_at DATETIME NOT NULL,
     UNIQUE KEY uq_absence_student_day (student_id, absence_date)
 );
+
+-- Absences per class per day, updated in the same transaction as absences.
+CREATE TABLE daily_class_absence (
+    absence_date DATE NOT NULL,
+    major_id INT NOT NULL REFERENCES majors (id),
+    absences INT NOT NULL,
+    PRIMARY KEY (absence_date, major_id)
+);
+
+CREATE INDEX ix_students_class_name ON students (major_id, full_name, id);
+CREATE INDEX ix_absences_date_student ON absences (absence_date, student_id);
+CREATE INDEX ix_absences_teacher_date ON absences (teacher_id, absence_date);
+CREATE INDEX ix_daily_class_absence_class ON daily_class_absence (major_id, absence_date);
+
+CREATE TABLE schema_version (
+    version INTEGER PRIMARY KEY,
+    description VARCHAR(200) NOT NULL,
+    applied_at DATETIME NOT NULL
+);
+
+-- Keys of rows written since the last export. Filled by AFTER INSERT/UPDATE/
+-- DELETE triggers on grades, majors, students, absences and
+-- authorized_teachers; read and pruned by the incremental exports.
+CREATE TABLE change_log (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    table_name VARCHAR(50) NOT NULL,
+    row_key VARCHAR(32) NOT NULL
+);
+
+CREATE TABLE export_state (
+    name VARCHAR(50) PRIMARY KEY,
+    value VARCHAR(100) NOT NULL
+);
+
+-- One row, bumped by AFTER INSERT/UPDATE/DELETE triggers on grades and
+-- majors. Each bot process compares it with its cached grade and major
+-- menus and reloads them when it has moved.
+CREATE TABLE catalog_version (
+    id INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL
+);